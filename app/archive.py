@@ -0,0 +1,292 @@
+"""Archival of closed rooms into compressed snapshots.
+
+Once a room is closed its questions, answers and votes are only read back
+for review. ``python -m app.manage archive-rooms`` moves each closed room out
+of the live tables, so they hold only active lectures. The room's child rows
+are written to a single gzip-compressed JSON-lines snapshot in
+``room_archives``, and the live rows are deleted. The room row itself stays,
+so room listings and ``GET /rooms/{id}`` are unchanged.
+
+Snapshot layout, one JSON document per line:
+
+* a header, ``{"version": 1, "room_id": ..., "columns": {table: [names]}}``
+* one row per line, ``[table, value, value, ...]``, in header column order
+
+The read endpoints (room questions, question detail, answers, vote counts)
+fall back to the snapshot for archived rooms and return the same response
+shape. Parsed snapshots are kept in a small LRU. ``/search`` matches the
+snapshot text of archived rooms (``Snapshot.search``), ranking those hits
+after live ones. Writes to archived questions answer "Question not found".
+"""
+
+import gzip
+import os
+import re
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime
+from operator import attrgetter
+
+import orjson
+from sqlalchemy import DateTime, delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .cache import TTLCache
+from .response_cache import invalidate
+from .serialization import dumps
+
+ARCHIVE_CACHE_SIZE = int(os.getenv("ARCHIVE_CACHE_SIZE", "50"))
+ARCHIVE_CACHE_TTL = float(os.getenv("ARCHIVE_CACHE_TTL", "600"))
+
+SNAPSHOT_VERSION = 1
+
+SNAPSHOT_TABLES = {
+    "questions": models.Question.__table__,
+    "answers": models.Answer.__table__,
+    "votes": models.QuestionVote.__table__,
+}
+
+# (room_id, archived_at) -> Snapshot; archives are never rewritten in place
+snapshots = TTLCache(ARCHIVE_CACHE_SIZE, ARCHIVE_CACHE_TTL)
+
+
+def encode_snapshot(room_id: int, tables) -> bytes:
+    """``tables`` maps a table name to its result rows (all columns)."""
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "room_id": room_id,
+        "columns": {name: list(SNAPSHOT_TABLES[name].c.keys()) for name in tables},
+    }
+    lines = [dumps(header)]
+    for name, rows in tables.items():
+        lines.extend(dumps([name, *row]) for row in rows)
+    return gzip.compress(b"\n".join(lines) + b"\n")
+
+
+class Snapshot:
+    """A decoded room snapshot; rows expose their columns as attributes."""
+
+    def __init__(self, data: bytes):
+        lines = gzip.decompress(data).splitlines()
+        header = orjson.loads(lines[0])
+        if header.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {header.get('version')}")
+        row_types, parsers = {}, {}
+        for name, names in header["columns"].items():
+            table = SNAPSHOT_TABLES[name]
+            row_type = namedtuple(name, names)
+            if name == "questions":
+                # QuestionOut.votes is the upvotes counter, as on the model
+                row_type = type(
+                    name,
+                    (row_type,),
+                    {"__slots__": (), "votes": property(attrgetter("upvotes"))},
+                )
+            row_types[name] = row_type
+            parsers[name] = [
+                i
+                for i, column in enumerate(names)
+                if column in table.c and isinstance(table.c[column].type, DateTime)
+            ]
+
+        tables = defaultdict(list)
+        for line in lines[1:]:
+            name, *values = orjson.loads(line)
+            for i in parsers[name]:
+                if values[i] is not None:
+                    values[i] = datetime.fromisoformat(values[i])
+            tables[name].append(row_types[name](*values))
+
+        self.room_id = header["room_id"]
+        self.questions = tables["questions"]
+        self.question_by_id = {q.id: q for q in self.questions}
+        self.answers = defaultdict(list)
+        for answer in tables["answers"]:
+            self.answers[answer.question_id].append(answer)
+
+    def question(self, question_id: int):
+        return self.question_by_id.get(question_id)
+
+    def answers_for(self, question_id: int):
+        return self.answers.get(question_id, [])
+
+    def search(self, terms):
+        """
+        (score, question) for each question whose own text, or one of whose
+        answers, contains every term. Words match whole and case-insensitively,
+        without the live index's stemming; title words count four times.
+        """
+        terms = [t.lower() for t in terms]
+        hits = []
+        for q in self.questions:
+            title = words(q.title)
+            body = words(q.description)
+            scores = []
+            if all(title[t] or body[t] for t in terms):
+                scores.append(sum(4 * title[t] + body[t] for t in terms))
+            for answer in self.answers_for(q.id):
+                content = words(answer.content)
+                if all(content[t] for t in terms):
+                    scores.append(sum(content[t] for t in terms))
+            if scores:
+                hits.append((max(scores), q))
+        return hits
+
+
+def words(text):
+    return Counter(re.findall(r"\w+", (text or "").lower()))
+
+
+def room_snapshot(db: Session, room_id: int):
+    """The archived room's Snapshot, or None if the room is not archived."""
+    archived_at = (
+        db.query(models.RoomArchive.archived_at)
+        .filter(models.RoomArchive.room_id == room_id)
+        .scalar()
+    )
+    if archived_at is None:
+        return None
+    key = (room_id, archived_at)
+    snapshot = snapshots.get(key)
+    if snapshot is None:
+        data = (
+            db.query(models.RoomArchive.snapshot)
+            .filter(models.RoomArchive.room_id == room_id)
+            .scalar()
+        )
+        if data is None:
+            return None
+        snapshot = Snapshot(data)
+        snapshots.set(key, snapshot)
+    return snapshot
+
+
+def archived_question(db: Session, question_id: int):
+    """(snapshot, question row) for an archived question, or (None, None)."""
+    room_id = (
+        db.query(models.ArchivedQuestion.room_id)
+        .filter(models.ArchivedQuestion.question_id == question_id)
+        .scalar()
+    )
+    snapshot = room_snapshot(db, room_id) if room_id is not None else None
+    if snapshot is None:
+        return None, None
+    return snapshot, snapshot.question(question_id)
+
+
+def archive_room(db: Session, room_id: int):
+    """
+    Move a closed room's questions, answers and votes into a snapshot.
+    Returns the RoomArchive, or None if the room is open, missing or
+    already archived. The child rows are locked while they are copied, so
+    votes and answers arriving meanwhile wait and then find no question.
+    """
+    room = (
+        db.query(models.Room.id, models.Room.is_open)
+        .filter(models.Room.id == room_id)
+        .with_for_update()
+        .first()
+    )
+    if room is None or room.is_open:
+        return None
+    already = (
+        db.query(models.RoomArchive.room_id)
+        .filter(models.RoomArchive.room_id == room_id)
+        .first()
+    )
+    if already:
+        return None
+
+    questions = SNAPSHOT_TABLES["questions"]
+    answers = SNAPSHOT_TABLES["answers"]
+    votes = SNAPSHOT_TABLES["votes"]
+    room_questions = select(questions.c.id).where(questions.c.room_id == room_id)
+    tables = {
+        "questions": db.execute(
+            select(questions)
+            .where(questions.c.room_id == room_id)
+            .order_by(questions.c.id)
+            .with_for_update()
+        ).all(),
+        "answers": db.execute(
+            select(answers)
+            .where(answers.c.question_id.in_(room_questions))
+            .order_by(answers.c.id)
+            .with_for_update()
+        ).all(),
+        "votes": db.execute(
+            select(votes)
+            .where(votes.c.question_id.in_(room_questions))
+            .order_by(votes.c.id)
+            .with_for_update()
+        ).all(),
+    }
+    question_ids = [q.id for q in tables["questions"]]
+    if question_ids and db.get_bind().dialect.name == "sqlite":
+        # SQLite hands a deleted max rowid out again, which would give a new
+        # question the id of an archived one; archive this room on a later run
+        if db.query(func.max(models.Question.id)).scalar() == question_ids[-1]:
+            db.rollback()
+            return None
+
+    archive = models.RoomArchive(
+        room_id=room_id,
+        archived_at=datetime.utcnow(),
+        question_count=len(question_ids),
+        snapshot=encode_snapshot(room_id, tables),
+    )
+    db.add(archive)
+    db.flush()
+    if question_ids:
+        db.execute(
+            insert(models.ArchivedQuestion.__table__),
+            [{"question_id": qid, "room_id": room_id} for qid in question_ids],
+        )
+    deleted = {
+        "votes": db.execute(
+            delete(votes).where(votes.c.question_id.in_(room_questions))
+        ).rowcount,
+        "answers": db.execute(
+            delete(answers).where(answers.c.question_id.in_(room_questions))
+        ).rowcount,
+        "questions": db.execute(
+            delete(questions).where(questions.c.room_id == room_id)
+        ).rowcount,
+    }
+    if any(deleted[name] != len(rows) for name, rows in tables.items()):
+        db.rollback()
+        raise RuntimeError(f"Room {room_id} changed while it was being archived")
+    db.commit()
+
+    invalidate(room_id=room_id)
+    for qid in question_ids:
+        invalidate(question_id=qid)
+    return archive
+
+
+def archivable_rooms(db: Session):
+    """Ids of closed rooms that have not been archived yet."""
+    return [
+        rid
+        for (rid,) in db.query(models.Room.id)
+        .outerjoin(models.RoomArchive, models.RoomArchive.room_id == models.Room.id)
+        .filter(models.Room.is_open == False, models.RoomArchive.room_id.is_(None))
+        .order_by(models.Room.id)
+    ]
+
+
+def drop_archive(db: Session, room_id: int):
+    """Delete a room's archive ahead of the room itself. The caller commits."""
+    question_ids = [
+        qid
+        for (qid,) in db.query(models.ArchivedQuestion.question_id).filter(
+            models.ArchivedQuestion.room_id == room_id
+        )
+    ]
+    db.query(models.ArchivedQuestion).filter(
+        models.ArchivedQuestion.room_id == room_id
+    ).delete(synchronize_session=False)
+    db.query(models.RoomArchive).filter(models.RoomArchive.room_id == room_id).delete(
+        synchronize_session=False
+    )
+    return question_ids
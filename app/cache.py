@@ -0,0 +1,174 @@
+"""Small in-process caches shared by the routers.
+
+``TTLCache`` is a bounded LRU map with expiring entries. Version stamps hold
+per-key change markers that cached entries are checked against, so a write in
+one place invalidates readers everywhere.
+
+By default stamps live in a small memory-mapped file in the temp directory
+(``CACHE_STAMP_FILE`` to move it), which every uvicorn worker on the host
+maps, so a write in one worker invalidates the caches of all of them. Keys
+are hashed into a fixed number of slots; two keys sharing a slot only cost
+each other an extra cache miss. ``CACHE_STAMP_DIR`` keeps one file per key
+in a shared directory instead. ``CACHE_STAMPS=local`` keeps stamps in
+process memory, which is only correct for a single worker; caches checked
+against local stamps are then capped at ``LOCAL_STAMP_TTL`` seconds.
+"""
+
+import getpass
+import mmap
+import os
+import secrets
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from .concurrency import blocking
+
+CACHE_STAMPS = os.getenv("CACHE_STAMPS", "shared")
+CACHE_STAMP_DIR = os.getenv("CACHE_STAMP_DIR")
+CACHE_STAMP_FILE = os.getenv("CACHE_STAMP_FILE")
+CACHE_STAMP_SLOTS = 1 << 16
+LOCAL_STAMP_TTL = float(os.getenv("LOCAL_STAMP_TTL", "2"))
+
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class VersionStamps:
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.shared = bool(directory)
+        # stamp files are read with blocking I/O; see concurrency.py
+        self.blocking_io = bool(directory)
+        self._local = {}
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, key):
+        if not self.directory:
+            return self._local.get(key, 0)
+        return blocking(self._read, os.path.join(self.directory, key))
+
+    def bump(self, key):
+        if not self.directory:
+            with self._lock:
+                self._local[key] = self._local.get(key, 0) + 1
+            return
+        blocking(self._write, os.path.join(self.directory, key))
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as f:
+                return f.read()
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def _write(path):
+        # Readers only compare for equality, so any fresh value will do and
+        # concurrent bumps from several workers cannot lose an invalidation.
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp, "w") as f:
+            f.write(f"{time.time_ns()}-{os.getpid()}")
+        os.replace(tmp, path)
+
+
+class SharedStamps:
+    """Stamps in a memory-mapped file of 8-byte slots, shared by every process mapping it."""
+
+    shared = True
+    blocking_io = False
+
+    def __init__(self, path, slots=CACHE_STAMP_SLOTS):
+        self.slots = slots
+        size = slots * 8
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+    def _offset(self, key):
+        # crc32, not hash(): every process must pick the same slot
+        return zlib.crc32(key.encode()) % self.slots * 8
+
+    def get(self, key):
+        return struct.unpack_from("<Q", self._map, self._offset(key))[0]
+
+    def bump(self, key):
+        # a fresh random value rather than an increment, so two processes
+        # bumping at once cannot leave the slot at a value a reader has seen
+        struct.pack_into("<Q", self._map, self._offset(key), secrets.randbits(64))
+
+
+def default_stamp_file():
+    # per user, so workers run by different accounts do not share the file
+    try:
+        user = getpass.getuser()
+    except Exception:
+        # no login name (e.g. a container without USER); share one file
+        user = "default"
+    name = "".join(c if c.isalnum() else "_" for c in user)
+    return os.path.join(tempfile.gettempdir(), f"questup-cache-stamps-{name}")
+
+
+def create_stamps():
+    if CACHE_STAMP_DIR:
+        return VersionStamps(CACHE_STAMP_DIR)
+    if CACHE_STAMPS == "local":
+        return VersionStamps()
+    if CACHE_STAMPS != "shared":
+        raise ValueError(f"Unknown CACHE_STAMPS {CACHE_STAMPS!r}")
+    return SharedStamps(CACHE_STAMP_FILE or default_stamp_file())
+
+
+stamps = create_stamps()
+
+
+def stamped_ttl(ttl):
+    """TTL for a cache checked against ``stamps``; short when they are process-local."""
+    return ttl if stamps.shared else min(ttl, LOCAL_STAMP_TTL)
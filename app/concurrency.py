@@ -0,0 +1,21 @@
+"""Keeping blocking calls off the event loop in async mode.
+
+With ``DB_ASYNC`` the sync handler bodies run inside
+``AsyncSession.run_sync``: in a greenlet on the event loop thread. Their ORM
+I/O is awaited on the async driver, but any other blocking call made there
+(a NOTIFY on a sync connection, a stamp file, the SQLite rate-limit store)
+would stall every request on the worker. Such calls go through ``blocking``,
+which hands them to the threadpool and waits for the result from inside the
+greenlet. Called from a worker thread, it just makes the call.
+"""
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.util.concurrency import await_only, in_greenlet
+
+
+def blocking(fn, *args):
+    if not in_greenlet():
+        # a worker thread, or plain async code (which should await
+        # run_in_threadpool itself)
+        return fn(*args)
+    return await_only(run_in_threadpool(fn, *args))
@@ -1,8 +1,21 @@
 from fastapi import Header, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from .database import SessionLocal
+from .database import SessionLocal, AsyncSessionLocal
+from .cache import TTLCache, stamped_ttl, stamps
 from . import models
 from typing import Optional
+import hashlib
+import os
+
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+
+# token -> (detached Teacher, version stamp it was loaded under). A logout in
+# another worker bumps the shared stamp, so the entry stops matching at once.
+teacher_cache = TTLCache(AUTH_CACHE_SIZE, stamped_ttl(AUTH_CACHE_TTL))
 
 
 def get_db():
@@ -13,11 +26,25 @@ def get_db():
         db.close()
 
 
-def get_current_teacher(
-    authorization: Optional[str] = Header(None, alias="Authorization"),
-    x_token: Optional[str] = Header(None, alias="x-token"),
-    db: Session = Depends(get_db),
-):
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def token_stamp_key(token: str) -> str:
+    # hashed: the token comes straight from a header and may name a stamp file
+    digest = hashlib.blake2b(token.encode(), digest_size=16).hexdigest()
+    return f"teacher-token-{digest}"
+
+
+def invalidate_teacher(token: Optional[str]):
+    """Drop cached auth for a token, here and (via its stamp) in other workers."""
+    if token:
+        teacher_cache.pop(token)
+        stamps.bump(token_stamp_key(token))
+
+
+def token_from_headers(authorization: Optional[str], x_token: Optional[str]):
     token = None
     if authorization:
         parts = authorization.split()
@@ -27,8 +54,69 @@ def get_current_teacher(
     if not token and x_token:
         token = x_token
 
+    return token
+
+
+def cached_teacher(token: str):
+    """
+    (cached Teacher or None, the token's current stamp). The stamp is read
+    before any DB lookup, so a logout committing during that lookup leaves
+    the result cached under a stamp that no longer matches.
+    """
+    stamp = stamps.get(token_stamp_key(token))
+    cached = teacher_cache.get(token)
+    if cached is not None and cached[1] == stamp:
+        return cached[0], stamp
+    return None, stamp
+
+
+def remember_teacher(token: str, teacher: models.Teacher, stamp):
+    teacher_cache.set(token, (teacher, stamp))
+
+
+def get_current_teacher(
+    authorization: Optional[str] = Header(None, alias="Authorization"),
+    x_token: Optional[str] = Header(None, alias="x-token"),
+    db: Session = Depends(get_db),
+):
+    token = token_from_headers(authorization, x_token)
     if not token:
         return None
 
+    teacher, stamp = cached_teacher(token)
+    if teacher is not None:
+        return teacher
+
     teacher = db.query(models.Teacher).filter(models.Teacher.token == token).first()
+    if teacher is None:
+        return None
+    # Detached so the cached copy can be handed to other requests/sessions.
+    db.expunge(teacher)
+    remember_teacher(token, teacher, stamp)
+    return teacher
+
+
+async def get_current_teacher_async(
+    authorization: Optional[str] = Header(None, alias="Authorization"),
+    x_token: Optional[str] = Header(None, alias="x-token"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    token = token_from_headers(authorization, x_token)
+    if not token:
+        return None
+
+    if stamps.blocking_io:
+        teacher, stamp = await run_in_threadpool(cached_teacher, token)
+    else:
+        teacher, stamp = cached_teacher(token)
+    if teacher is not None:
+        return teacher
+
+    teacher = await db.scalar(
+        select(models.Teacher).where(models.Teacher.token == token)
+    )
+    if teacher is None:
+        return None
+    db.expunge(teacher)
+    remember_teacher(token, teacher, stamp)
     return teacher
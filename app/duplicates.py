@@ -0,0 +1,197 @@
+"""Near-duplicate detection for new questions.
+
+Each room with recent activity gets an in-memory index of its open
+questions. A question is represented by the set of character trigrams of its
+normalised title and description. A 16-slot MinHash signature, split into 8
+bands of 2, files it under 8 LSH buckets. Only questions that share a bucket
+with the new text are candidates, and each candidate is confirmed with its
+exact trigram Jaccard similarity. The check therefore costs the same for a
+room with thousands of questions as for one with ten.
+
+A room's index is built from the database on first use and then updated by
+this worker's writes. Before anything is reported, it picks up questions
+posted through other workers (``id > last_id``), and candidates are
+re-read, so deleted or solved questions are never suggested.
+"""
+
+import os
+import re
+import threading
+import zlib
+from collections import defaultdict
+
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .cache import TTLCache
+from .serialization import columns, dump
+
+DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", "0.5"))
+DUPLICATE_MAX_RESULTS = int(os.getenv("DUPLICATE_MAX_RESULTS", "5"))
+DUPLICATE_INDEX_ROOMS = int(os.getenv("DUPLICATE_INDEX_ROOMS", "200"))
+DUPLICATE_INDEX_TTL = float(os.getenv("DUPLICATE_INDEX_TTL", "3600"))
+
+BANDS = 8
+ROWS = 2
+SLOTS = BANDS * ROWS
+
+
+def shingles(title, description=None):
+    text = " ".join(re.findall(r"\w+", f"{title} {description or ''}".lower()))
+    if len(text) < 3:
+        return {text} if text else set()
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def band_keys(trigrams):
+    """
+    LSH bucket keys from a one-permutation MinHash: each trigram is hashed
+    once and lands in one of SLOTS slots, each slot keeping its minimum.
+    Empty slots borrow from the next filled one (rotation densification).
+    """
+    signature = [None] * SLOTS
+    for trigram in trigrams:
+        h = zlib.crc32(trigram.encode())
+        slot, value = h % SLOTS, h // SLOTS
+        if signature[slot] is None or value < signature[slot]:
+            signature[slot] = value
+    if all(v is None for v in signature):
+        return []
+    for slot in range(SLOTS):
+        offset = 1
+        while signature[slot] is None:
+            borrowed = signature[(slot + offset) % SLOTS]
+            if borrowed is not None:
+                signature[slot] = (borrowed, offset)
+            offset += 1
+    return [
+        (band, *signature[band * ROWS : (band + 1) * ROWS]) for band in range(BANDS)
+    ]
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class RoomIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last_id = 0
+        self.trigrams = {}
+        self.keys = {}
+        self.buckets = defaultdict(set)
+
+    def add(self, question_id, trigrams):
+        self.remove(question_id)
+        keys = band_keys(trigrams)
+        self.trigrams[question_id] = trigrams
+        self.keys[question_id] = keys
+        for key in keys:
+            self.buckets[key].add(question_id)
+
+    def remove(self, question_id):
+        self.trigrams.pop(question_id, None)
+        for key in self.keys.pop(question_id, ()):
+            bucket = self.buckets[key]
+            bucket.discard(question_id)
+            if not bucket:
+                del self.buckets[key]
+
+    def candidates(self, trigrams):
+        found = set()
+        for key in band_keys(trigrams):
+            found |= self.buckets.get(key, set())
+        scored = [(jaccard(trigrams, self.trigrams[qid]), qid) for qid in found]
+        return sorted((s for s in scored if s[0] >= DUPLICATE_THRESHOLD), reverse=True)[
+            :DUPLICATE_MAX_RESULTS
+        ]
+
+
+class DuplicateIndex:
+    def __init__(self):
+        self._rooms = TTLCache(DUPLICATE_INDEX_ROOMS, DUPLICATE_INDEX_TTL)
+        self._lock = threading.Lock()
+
+    def _room(self, room_id):
+        with self._lock:
+            room = self._rooms.get(room_id)
+            if room is None:
+                room = RoomIndex()
+                self._rooms.set(room_id, room)
+            return room
+
+    def similar(self, db: Session, room_id: int, title, description=None):
+        """Open questions in the room that look like this text, most similar first."""
+        room = self._room(room_id)
+        new = (
+            db.query(
+                models.Question.id,
+                models.Question.title,
+                models.Question.description,
+            )
+            .filter(
+                models.Question.room_id == room_id,
+                models.Question.id > room.last_id,
+                models.Question.is_solved == False,
+            )
+            .order_by(models.Question.id)
+            .all()
+        )
+        trigrams = shingles(title, description)
+        with room.lock:
+            for qid, q_title, q_description in new:
+                room.add(qid, shingles(q_title, q_description))
+                room.last_id = max(room.last_id, qid)
+            found = room.candidates(trigrams)
+        if not found:
+            return []
+
+        rows = (
+            db.query(*columns(models.Question, schemas.QuestionOut))
+            .filter(
+                models.Question.id.in_([qid for _, qid in found]),
+                models.Question.is_solved == False,
+            )
+            .all()
+        )
+        results = []
+        with room.lock:
+            current = {row.id: row for row in rows}
+            for _, qid in found:
+                row = current.get(qid)
+                if row is None:
+                    room.remove(qid)
+                    continue
+                q_trigrams = shingles(row.title, row.description)
+                room.add(qid, q_trigrams)
+                score = jaccard(trigrams, q_trigrams)
+                if score >= DUPLICATE_THRESHOLD:
+                    results.append(
+                        {
+                            **dump(schemas.QuestionOut, row),
+                            "similarity": round(score, 3),
+                        }
+                    )
+        return sorted(results, key=lambda r: r["similarity"], reverse=True)
+
+    def add(self, room_id, question_id, title, description=None):
+        room = self._rooms.get(room_id)
+        if room is not None:
+            # last_id is left alone: other workers may have posted below
+            # question_id since the last catch-up
+            with room.lock:
+                room.add(question_id, shingles(title, description))
+
+    def remove(self, room_id, question_id):
+        room = self._rooms.get(room_id)
+        if room is not None:
+            with room.lock:
+                room.remove(question_id)
+
+    def drop_room(self, room_id):
+        self._rooms.pop(room_id)
+
+
+duplicates = DuplicateIndex()
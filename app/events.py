@@ -0,0 +1,203 @@
+"""Per-room event fan-out for the live feed.
+
+Routers call ``publish`` after committing a change; every client connected to
+that room's feed receives the event. Each event is encoded to JSON once and the
+same string is handed to every subscriber.
+
+Two brokers are available, picked with the ``EVENT_BROKER`` env var:
+
+* ``memory`` (default) - fan-out inside this process only. Fine for a single
+  uvicorn worker.
+* ``postgres`` - events travel through Postgres LISTEN/NOTIFY, so a change made
+  in one worker reaches feed clients connected to any other worker.
+
+Subscribers get a bounded queue. A client that falls ``ROOM_FEED_QUEUE_SIZE``
+events behind is dropped (its feed is closed) instead of buffering without
+limit; it is expected to reconnect and reload the room listing.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+import time
+from collections import defaultdict
+
+from fastapi.encoders import jsonable_encoder
+
+from . import metrics
+from .concurrency import blocking
+from .database import engine
+
+logger = logging.getLogger(__name__)
+
+EVENT_BROKER = os.getenv("EVENT_BROKER", "memory")
+ROOM_FEED_QUEUE_SIZE = int(os.getenv("ROOM_FEED_QUEUE_SIZE", "100"))
+
+PG_CHANNEL = "questup_room_events"
+# NOTIFY payloads are capped at 8000 bytes by Postgres.
+PG_MAX_PAYLOAD = 7900
+
+
+class Subscription:
+    def __init__(self, room_id, queue_size):
+        self.room_id = room_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+    async def get(self):
+        """Next event for this subscriber, or None once it has been dropped."""
+        return await self.queue.get()
+
+    def offer(self, message):
+        # Runs on the subscriber's own loop.
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class MemoryBroker:
+    def __init__(self, queue_size=ROOM_FEED_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.dropped_subscribers = 0
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, room_id):
+        sub = Subscription(room_id, self.queue_size)
+        with self._lock:
+            self._subscribers[room_id].add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subscribers.get(sub.room_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.room_id]
+            if sub.dropped:
+                self.dropped_subscribers += 1
+        if sub.dropped:
+            metrics.FEED_DROPPED_SUBSCRIBERS.inc()
+
+    def has_subscribers(self, room_id):
+        return room_id in self._subscribers
+
+    def publish(self, room_id, message):
+        self.deliver(room_id, message)
+
+    def deliver(self, room_id, message):
+        with self._lock:
+            subs = list(self._subscribers.get(room_id, ()))
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub.offer, message)
+            except RuntimeError:
+                # subscriber's loop already closed; it unsubscribes on its way out
+                pass
+
+
+class PostgresBroker(MemoryBroker):
+    """
+    Cross-worker broker. Publishing sends a NOTIFY; a listener thread in every
+    worker receives it (including the publishing one) and delivers locally.
+    """
+
+    def __init__(self, queue_size=ROOM_FEED_QUEUE_SIZE):
+        super().__init__(queue_size)
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def subscribe(self, room_id):
+        self._ensure_listener()
+        return super().subscribe(room_id)
+
+    def has_subscribers(self, room_id):
+        # they may be connected to another worker
+        return True
+
+    def publish(self, room_id, message):
+        payload = json.dumps({"room_id": room_id, "message": message})
+        if len(payload.encode("utf-8")) > PG_MAX_PAYLOAD:
+            # Too big for NOTIFY: tell clients to refetch instead.
+            payload = json.dumps(
+                {
+                    "room_id": room_id,
+                    "message": json.dumps({"event": "resync", "room_id": room_id}),
+                }
+            )
+        blocking(self._notify, payload)
+
+    def _notify(self, payload):
+        conn = engine.raw_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT pg_notify(%s, %s)", (PG_CHANNEL, payload))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _ensure_listener(self):
+        with self._listener_lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(
+                    target=self._listen, name="room-events-listener", daemon=True
+                )
+                self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                self._listen_once()
+            except Exception:
+                logger.exception("room event listener failed, reconnecting")
+                time.sleep(1)
+
+    def _listen_once(self):
+        conn = engine.raw_connection()
+        try:
+            dbapi_conn = conn.driver_connection
+            dbapi_conn.autocommit = True
+            dbapi_conn.cursor().execute(f"LISTEN {PG_CHANNEL}")
+            while True:
+                if select.select([dbapi_conn], [], [], 5) == ([], [], []):
+                    continue
+                dbapi_conn.poll()
+                while dbapi_conn.notifies:
+                    note = dbapi_conn.notifies.pop(0)
+                    data = json.loads(note.payload)
+                    self.deliver(data["room_id"], data["message"])
+        finally:
+            conn.invalidate()
+
+
+def create_broker():
+    if EVENT_BROKER == "postgres":
+        return PostgresBroker()
+    if EVENT_BROKER != "memory":
+        raise ValueError(f"Unknown EVENT_BROKER {EVENT_BROKER!r}")
+    return MemoryBroker()
+
+
+broker = create_broker()
+
+
+def publish(room_id, event, **data):
+    if not broker.has_subscribers(room_id):
+        return
+    message = json.dumps(jsonable_encoder({"event": event, "room_id": room_id, **data}))
+    try:
+        broker.publish(room_id, message)
+    except Exception:
+        # The write already committed; a lost feed event must not fail the request.
+        logger.exception("failed to publish %s for room %s", event, room_id)
@@ -1,19 +1,63 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from .database import Base, engine
+from .database import (
+    Base,
+    engine,
+    async_engine,
+    DB_ASYNC,
+    pool_capacity,
+    pool_stats,
+)
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from .routers.auth import router as auth
 
 from .routers.rooms import router as room
 from .routers.questions import router as question
 from .routers.answers import router as answer
 from .routers.votes import router as vote
+from .routers.feed import router as feed
+from .routers.search import router as search
+from .routers.async_mode import async_router
+from .vote_batcher import batcher
+from . import metrics, models
+from .deps import get_current_teacher
+from .profiling import (
+    ProfilingMiddleware,
+    TimedJSONResponse,
+    instrument_engine,
+    route_windows,
+)
 
 # creating the database tables
+# (existing databases get new columns/indexes via `python -m app.manage migrate`,
+# which also builds the search index that /search needs)
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Questup Backend")
+instrument_engine(engine)
+metrics.instrument_pool(engine, pool_capacity(engine.pool))
+if async_engine is not None:
+    instrument_engine(async_engine.sync_engine)
+    metrics.instrument_pool(
+        async_engine.sync_engine, pool_capacity(async_engine.sync_engine.pool)
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # write out any votes still queued by VOTE_BATCHING before exiting
+    await run_in_threadpool(batcher.stop)
+    metrics.worker_exiting()
+
+
+app = FastAPI(
+    title="Questup Backend",
+    lifespan=lifespan,
+    default_response_class=TimedJSONResponse,
+)
 
 # # mounting the frontend static files
 # app.mount("/css", StaticFiles(directory="../css"), name="css")
@@ -28,13 +72,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 
+# Auth is left out of async mode: its password endpoints are already async
+# and the rest are cheap sync handlers.
 app.include_router(auth)
-app.include_router(room)
-app.include_router(question)
-app.include_router(answer)
-app.include_router(vote)
+for r in (room, question, answer, vote, search):
+    app.include_router(async_router(r) if DB_ASYNC else r)
+app.include_router(feed)
 
 
 # @app.get("/")
@@ -60,3 +108,21 @@ def home():
 @app.get("/health")
 def health():
     return {"status": "Running Sucesfully!!!"}
+
+
+@app.get("/health/db")
+def health_db():
+    return {"status": "ok", "pool": pool_stats()}
+
+
+@app.get("/debug/profile")
+def debug_profile(teacher: models.Teacher = Depends(get_current_teacher)):
+    if not teacher:
+        return {"success": False, "detail": "Unauthorized"}
+    return {"status": "ok", "routes": route_windows.summary()}
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
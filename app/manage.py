@@ -0,0 +1,172 @@
+"""Maintenance commands: ``python -m app.manage <command>``."""
+
+import argparse
+
+from sqlalchemy import delete, func, inspect, select, text
+
+from .archive import archivable_rooms, archive_room
+from .database import Base, SessionLocal, engine
+from .ranking import refresh_hot_scores
+from .search import ensure_search_index
+from . import models
+
+# Columns added after the first release. ``create_all`` never alters existing
+# tables, so these are added in place on databases created before them.
+COLUMN_MIGRATIONS = [
+    ("questions", "upvotes", "INTEGER NOT NULL DEFAULT 0"),
+    ("questions", "downvotes", "INTEGER NOT NULL DEFAULT 0"),
+    ("questions", "hot_score", "FLOAT NOT NULL DEFAULT 0"),
+]
+
+VOTER_UNIQUE_INDEX = "uq_question_votes_question_id_voter_token"
+
+
+def migrate():
+    Base.metadata.create_all(bind=engine)
+    inspector = inspect(engine)
+    added = []
+    with engine.begin() as conn:
+        for table, column, ddl in COLUMN_MIGRATIONS:
+            existing = {c["name"] for c in inspector.get_columns(table)}
+            if column not in existing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+                added.append(f"{table}.{column}")
+
+        # Same story for indexes declared in models.__table_args__.
+        deduped = False
+        for table in Base.metadata.sorted_tables:
+            existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    if index.name == VOTER_UNIQUE_INDEX:
+                        deduped = dedupe_votes(conn)
+                    index.create(bind=conn)
+                    added.append(index.name)
+
+    if ensure_search_index(engine):
+        added.append("search index")
+
+    if deduped or "questions.hot_score" in added:
+        db = SessionLocal()
+        try:
+            reconcile_vote_counters(db)
+        finally:
+            db.close()
+    return added
+
+
+def dedupe_votes(conn):
+    """Keep only each voter's latest vote per question (needed before the unique index)."""
+    votes = models.QuestionVote.__table__
+    latest = (
+        select(func.max(votes.c.id))
+        .where(votes.c.voter_token.is_not(None))
+        .group_by(votes.c.question_id, votes.c.voter_token)
+    )
+    result = conn.execute(
+        delete(votes).where(votes.c.voter_token.is_not(None), votes.c.id.not_in(latest))
+    )
+    return result.rowcount > 0
+
+
+def reconcile_vote_counters(db):
+    """Rebuild the vote counters from question_votes, then the hot scores."""
+
+    def tally(vote_type):
+        return (
+            select(func.count(models.QuestionVote.id))
+            .where(
+                models.QuestionVote.question_id == models.Question.id,
+                models.QuestionVote.vote_type == vote_type,
+            )
+            .scalar_subquery()
+        )
+
+    updated = db.query(models.Question).update(
+        {
+            models.Question.upvotes: tally("up"),
+            models.Question.downvotes: tally("down"),
+        },
+        synchronize_session=False,
+    )
+    last_id = 0
+    while True:
+        ids = [
+            qid
+            for (qid,) in db.query(models.Question.id)
+            .filter(models.Question.id > last_id)
+            .order_by(models.Question.id)
+            .limit(1000)
+        ]
+        if not ids:
+            break
+        refresh_hot_scores(db, ids)
+        last_id = ids[-1]
+    db.commit()
+    return updated
+
+
+def archive_rooms(db, room_ids=None):
+    """Archive ``room_ids`` (default: every closed, unarchived room); yields a line per room."""
+    for room_id in room_ids or archivable_rooms(db):
+        try:
+            archive = archive_room(db, room_id)
+        except RuntimeError as e:
+            yield f"Room {room_id}: {e}, skipped"
+            continue
+        if archive is None:
+            yield (
+                f"Room {room_id}: skipped (open, missing, already archived "
+                "or holding the newest question)"
+            )
+        else:
+            yield (
+                f"Room {room_id}: archived {archive.question_count} questions "
+                f"into {len(archive.snapshot) / 1024:.1f} KiB"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.manage")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser(
+        "migrate", help="add missing columns and indexes to an existing database"
+    )
+    commands.add_parser(
+        "reconcile-votes", help="rebuild question vote counters from the vote table"
+    )
+    archive = commands.add_parser(
+        "archive-rooms",
+        help="move closed rooms' questions, answers and votes into snapshots",
+    )
+    archive.add_argument(
+        "--room-id",
+        type=int,
+        action="append",
+        dest="room_ids",
+        help="archive only this room (repeatable)",
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "migrate":
+        added = migrate()
+        print(f"Added: {', '.join(added)}" if added else "Schema up to date")
+    elif args.command == "reconcile-votes":
+        db = SessionLocal()
+        try:
+            print(
+                f"Reconciled vote counters for {reconcile_vote_counters(db)} questions"
+            )
+        finally:
+            db.close()
+    elif args.command == "archive-rooms":
+        db = SessionLocal()
+        try:
+            lines = list(archive_rooms(db, args.room_ids))
+            print("\n".join(lines) if lines else "No closed rooms to archive")
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Prometheus metrics, scraped from ``GET /metrics``.
+
+With several uvicorn workers, set ``PROMETHEUS_MULTIPROC_DIR`` to an empty
+directory shared by the workers (and wipe it on deploy). Each worker then
+writes its samples there and ``/metrics`` merges them, so whichever worker
+answers the scrape reports totals for the whole server. Without it, metrics
+cover the single process that serves the scrape.
+"""
+
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+HTTP_REQUESTS = Counter(
+    "questup_http_requests_total",
+    "HTTP requests by route and status",
+    ["method", "route", "status"],
+)
+HTTP_LATENCY = Histogram(
+    "questup_http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+DB_POOL_CHECKED_OUT = Gauge(
+    "questup_db_pool_checked_out",
+    "Connections currently checked out of the pool",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CAPACITY = Gauge(
+    "questup_db_pool_capacity",
+    "Pool size plus max overflow",
+    multiprocess_mode="livesum",
+)
+DB_POOL_WAIT = Histogram(
+    "questup_db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+DB_POOL_TIMEOUTS = Counter(
+    "questup_db_pool_timeouts_total", "Checkouts that timed out waiting"
+)
+
+QUESTIONS_POSTED = Counter("questup_questions_posted_total", "Questions posted")
+VOTES_CAST = Counter("questup_votes_cast_total", "Votes cast", ["vote_type"])
+VOTE_QUEUE_DEPTH = Gauge(
+    "questup_vote_queue_depth",
+    "Votes accepted by VOTE_BATCHING and not yet written",
+    multiprocess_mode="livesum",
+)
+VOTES_FLUSHED = Counter(
+    "questup_votes_flushed_total", "Queued votes written to the database"
+)
+VOTES_DROPPED = Counter(
+    "questup_votes_dropped_total",
+    "Queued votes lost because their batch failed every retry",
+)
+ANSWERS_ACCEPTED = Counter("questup_answers_accepted_total", "Answers accepted")
+LOGINS = Counter("questup_logins_total", "Teacher login attempts", ["result"])
+PASSWORD_QUEUE_DEPTH = Gauge(
+    "questup_password_queue_depth",
+    "bcrypt jobs queued or running on the password pool",
+    multiprocess_mode="livesum",
+)
+PASSWORD_REJECTED = Counter(
+    "questup_password_rejected_total",
+    "Password hashes/checks refused with 503 because the pool was full",
+)
+RATE_LIMITED = Counter(
+    "questup_rate_limited_total", "Requests refused by a rate limit", ["rule"]
+)
+FEED_DROPPED_SUBSCRIBERS = Counter(
+    "questup_feed_dropped_subscribers_total",
+    "Room feed clients disconnected for falling too far behind",
+)
+ROOM_CODES_TRIED = Counter(
+    "questup_room_codes_tried_total", "Room codes generated for new rooms"
+)
+ROOM_CODE_COLLISIONS = Counter(
+    "questup_room_code_collisions_total", "Generated room codes already in use"
+)
+
+
+def instrument_pool(engine, capacity):
+    DB_POOL_CAPACITY.inc(capacity)
+    event.listen(engine, "checkout", lambda *a: DB_POOL_CHECKED_OUT.inc())
+    event.listen(engine, "checkin", lambda *a: DB_POOL_CHECKED_OUT.dec())
+
+
+def render():
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def worker_exiting():
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            path = route.path if route else "<unmatched>"
+            HTTP_REQUESTS.labels(scope["method"], path, str(status)).inc()
+            HTTP_LATENCY.labels(scope["method"], path).observe(
+                time.perf_counter() - start
+            )
@@ -1,5 +1,16 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    DateTime,
+    Boolean,
+    ForeignKey,
+    Text,
+    Index,
+    Float,
+    LargeBinary,
+)
+from sqlalchemy.orm import relationship, synonym
 from datetime import datetime
 from .database import Base
 
@@ -23,6 +34,10 @@ class TeacherRequest(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     approved = Column(Boolean, default=False)
 
+    __table_args__ = (
+        Index("ix_teacher_requests_approved_created_at", "approved", "created_at"),
+    )
+
 
 class Subject(Base):
     __tablename__ = "subjects"
@@ -53,8 +68,18 @@ class Question(Base):
     student_name = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     is_solved = Column(Boolean, default=False)
+    upvotes = Column(Integer, nullable=False, default=0, server_default="0")
+    downvotes = Column(Integer, nullable=False, default=0, server_default="0")
+    # see ranking.py; refreshed whenever the vote counters change
+    hot_score = Column(Float, nullable=False, default=0, server_default="0")
 
     room = relationship("Room")
+    votes = synonym("upvotes")
+
+    __table_args__ = (
+        Index("ix_questions_room_id_created_at", "room_id", "created_at"),
+        Index("ix_questions_room_id_hot_score", "room_id", "hot_score", "id"),
+    )
 
 
 class Answer(Base):
@@ -66,6 +91,10 @@ class Answer(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     is_accepted = Column(Boolean, default=False)
 
+    __table_args__ = (
+        Index("ix_answers_question_id_created_at", "question_id", "created_at"),
+    )
+
 
 class QuestionVote(Base):
     __tablename__ = "question_votes"
@@ -74,3 +103,34 @@ class QuestionVote(Base):
     voter_token = Column(String, nullable=True)
     vote_type = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_question_votes_question_id_vote_type", "question_id", "vote_type"),
+        # one vote per voter per question; votes now require a voter_token, so
+        # only older rows lack one
+        Index(
+            "uq_question_votes_question_id_voter_token",
+            "question_id",
+            "voter_token",
+            unique=True,
+        ),
+    )
+
+
+# A closed room's questions, answers and votes, moved out of the live tables
+# into one compressed snapshot (see archive.py).
+class RoomArchive(Base):
+    __tablename__ = "room_archives"
+    room_id = Column(Integer, ForeignKey("rooms.id"), primary_key=True)
+    archived_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    question_count = Column(Integer, nullable=False)
+    snapshot = Column(LargeBinary, nullable=False)
+
+
+# Which archive holds a question, so /questions/{id} keeps resolving.
+class ArchivedQuestion(Base):
+    __tablename__ = "archived_questions"
+    question_id = Column(Integer, primary_key=True)
+    room_id = Column(
+        Integer, ForeignKey("room_archives.room_id"), nullable=False, index=True
+    )
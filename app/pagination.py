@@ -0,0 +1,95 @@
+"""Keyset (cursor) pagination for list endpoints.
+
+A page is ordered by a list of columns ending in a unique one (the primary
+key), e.g. ``(created_at, id)``. The cursor is an opaque token holding the
+sort values of the last row returned; the next page continues strictly after
+it, so no page ever needs an OFFSET scan.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import literal, tuple_
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(values):
+    raw = json.dumps(
+        [v.isoformat() if isinstance(v, datetime) else v for v in values],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, columns):
+    """Raises ValueError for a cursor that was not produced for these columns."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError("Invalid cursor")
+    decoded = []
+    for column, value in zip(columns, values):
+        if column.type.python_type is datetime:
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise ValueError("Invalid cursor")
+        elif not isinstance(value, column.type.python_type):
+            raise ValueError("Invalid cursor")
+        decoded.append(value)
+    return decoded
+
+
+def clamp_limit(limit):
+    return max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+
+
+def paginate(query, columns, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=True):
+    """
+    Apply keyset ordering/filtering to ``query`` and fetch one page.
+
+    Returns ``(rows, next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    limit = clamp_limit(limit)
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        row = tuple_(*columns)
+        after = tuple_(*(literal(v, c.type) for c, v in zip(columns, values)))
+        query = query.filter(row < after if descending else row > after)
+    query = query.order_by(*(c.desc() if descending else c.asc() for c in columns))
+
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], c.key) for c in columns])
+    return rows, next_cursor
+
+
+def paginate_rows(rows, columns, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=True):
+    """``paginate`` over rows already in memory, with the same order and cursors."""
+    limit = clamp_limit(limit)
+    keys = [c.key for c in columns]
+
+    def sort_key(row):
+        return tuple(getattr(row, k) for k in keys)
+
+    rows = sorted(rows, key=sort_key, reverse=descending)
+    if cursor:
+        after = tuple(decode_cursor(cursor, columns))
+        rows = [
+            r
+            for r in rows
+            if (sort_key(r) < after if descending else sort_key(r) > after)
+        ]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort_key(rows[-1]))
+    return rows, next_cursor
@@ -0,0 +1,138 @@
+"""Password hashing on a dedicated, size-limited worker pool.
+
+bcrypt is deliberately slow. Running it on Starlette's shared threadpool lets
+a burst of logins starve every other endpoint, so hashing and verification
+are sent to their own pool (``PASSWORD_WORKERS`` threads; bcrypt releases
+the GIL). ``hash_password`` and ``verify_password`` are coroutines: the
+calling ``async def`` endpoint awaits the pool and holds no threadpool
+thread meanwhile. At most ``PASSWORD_MAX_PENDING`` jobs (capped at half of
+anyio's thread limit) may be queued or running; past that, callers get a 503
+with ``Retry-After`` instead of piling up. Queue depth and rejections are
+exported in ``/metrics``.
+
+``BCRYPT_ROUNDS`` sets the cost. Hashes made with a different cost are
+flagged by ``needs_rehash`` so login can upgrade them transparently.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import anyio.to_thread
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", "16"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__truncate_error=False,
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+
+class PasswordPool:
+    def __init__(self, workers, max_pending):
+        self.max_pending = max_pending
+        self._capped = False
+        self.pending = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="bcrypt"
+        )
+
+    def _cap_pending(self):
+        """
+        Logins still take a threadpool thread for their DB reads and writes,
+        so never admit more of them than half of anyio's thread limiter.
+        Needs a running event loop, hence done on first use.
+        """
+        self._capped = True
+        threads = anyio.to_thread.current_default_thread_limiter().total_tokens
+        if math.isinf(threads):
+            return
+        cap = max(1, int(threads) // 2)
+        if self.max_pending > cap:
+            logger.warning(
+                "PASSWORD_MAX_PENDING=%d exceeds half the %d-thread threadpool; "
+                "using %d",
+                self.max_pending,
+                threads,
+                cap,
+            )
+            self.max_pending = cap
+
+    async def run(self, fn, *args):
+        if not self._capped:
+            self._cap_pending()
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                metrics.PASSWORD_REJECTED.inc()
+                raise HTTPException(
+                    status_code=503,
+                    detail="Too many login attempts in progress, retry shortly",
+                    headers={"Retry-After": "1"},
+                )
+            self.pending += 1
+        metrics.PASSWORD_QUEUE_DEPTH.inc()
+        try:
+            return await asyncio.wrap_future(self._executor.submit(fn, *args))
+        finally:
+            with self._lock:
+                self.pending -= 1
+            metrics.PASSWORD_QUEUE_DEPTH.dec()
+
+
+pool = PasswordPool(PASSWORD_WORKERS, PASSWORD_MAX_PENDING)
+
+
+def _verify(plain, hashed):
+    try:
+        return pwd_context.verify(plain, hashed)
+    except Exception:
+        return False
+
+
+async def hash_password(pw: str) -> str:
+    if not pw or len(pw) == 0:
+        raise ValueError("Password cannot be empty")
+
+    # Bcrypt has a 72-byte limit. We must truncate BYTES, not characters.
+    # 1. Encode to bytes (utf-8)
+    pw_bytes = pw.encode("utf-8")
+
+    # 2. Truncate if longer than 72 bytes
+    if len(pw_bytes) > 72:
+        pw_bytes = pw_bytes[:72]
+
+    # 3. Decode back to string for passlib, ignoring any partial multi-byte character at the end
+    # using 'ignore' avoids errors if we cut a unicode char in half.
+    # Note: passlib will encode it again, but now we know it fits!
+    truncated_pw = pw_bytes.decode("utf-8", errors="ignore")
+
+    return await pool.run(pwd_context.hash, truncated_pw)
+
+
+async def verify_password(plain: str, hashed: str) -> bool:
+    return await pool.run(_verify, plain, hashed)
+
+
+def needs_rehash(hashed: str) -> bool:
+    try:
+        return pwd_context.needs_update(hashed)
+    except Exception:
+        return False
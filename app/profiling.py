@@ -0,0 +1,249 @@
+"""Per-request profiling: SQL query count, DB time, serialization time.
+
+``ProfilingMiddleware`` gives every request a ``RequestStats`` (via a context
+variable, which Starlette copies into the threadpool). SQLAlchemy cursor
+events add each statement's count and duration to it, and
+``TimedJSONResponse`` adds the time spent encoding the body. The totals go
+out in a ``Server-Timing`` header and into a rolling per-route window that
+``/debug/profile`` summarises.
+
+Set ``PROFILE_SLOW_MS`` to also run a sampling profiler: a background thread
+snapshots every thread's stack each ``PROFILE_SAMPLE_INTERVAL_MS`` while
+requests are in flight, and requests slower than the threshold get the
+samples from their lifetime written to ``PROFILE_DIR`` in folded-stack
+format (feed it to flamegraph.pl or speedscope). Only samples from the
+threads the request ran on are kept: the event loop thread, plus the
+threadpool threads that ran its queries or encoded its response.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+from .serialization import dumps
+
+PROFILE_WINDOW = int(os.getenv("PROFILE_WINDOW", "1000"))
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_DUMPS = int(os.getenv("PROFILE_MAX_DUMPS", "100"))
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "serialize_seconds", "threads")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.threads = {threading.get_ident()}
+
+    def server_timing(self, total):
+        return (
+            f'db;dur={self.db_seconds * 1000:.2f};desc="{self.queries} queries", '
+            f"serialize;dur={self.serialize_seconds * 1000:.2f}, "
+            f"total;dur={total * 1000:.2f}"
+        )
+
+
+current_stats = ContextVar("current_stats", default=None)
+
+
+@contextmanager
+def serializing():
+    stats = current_stats.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if stats is not None:
+            stats.serialize_seconds += time.perf_counter() - start
+            stats.threads.add(threading.get_ident())
+
+
+class TimedJSONResponse(JSONResponse):
+    def render(self, content):
+        with serializing():
+            return dumps(content)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info["query_start"].pop()
+    stats = current_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - start
+        stats.threads.add(threading.get_ident())
+
+
+def instrument_engine(engine):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+class RouteWindows:
+    """Last ``PROFILE_WINDOW`` samples per route."""
+
+    def __init__(self, size=PROFILE_WINDOW):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=size))
+        self._counts = Counter()
+
+    def record(self, route, total, stats):
+        with self._lock:
+            self._counts[route] += 1
+            self._samples[route].append(
+                (total, stats.db_seconds, stats.serialize_seconds, stats.queries)
+            )
+
+    def summary(self):
+        with self._lock:
+            snapshot = {route: list(s) for route, s in self._samples.items()}
+            counts = dict(self._counts)
+        out = {}
+        for route, samples in sorted(snapshot.items()):
+            totals = [s[0] * 1000 for s in samples]
+            n = len(samples)
+            out[route] = {
+                "requests": counts[route],
+                "window": n,
+                "p50_ms": round(_percentile(totals, 50), 2),
+                "p95_ms": round(_percentile(totals, 95), 2),
+                "p99_ms": round(_percentile(totals, 99), 2),
+                "max_ms": round(max(totals), 2),
+                "avg_db_ms": round(sum(s[1] for s in samples) * 1000 / n, 2),
+                "avg_serialize_ms": round(sum(s[2] for s in samples) * 1000 / n, 2),
+                "avg_queries": round(sum(s[3] for s in samples) / n, 2),
+                "max_queries": max(s[3] for s in samples),
+            }
+        return out
+
+
+route_windows = RouteWindows()
+
+
+class StackSampler:
+    """Samples all thread stacks while at least one request is in flight."""
+
+    def __init__(self, interval, keep_seconds=60):
+        self.interval = interval
+        self.dumps = 0
+        self._samples = deque(maxlen=int(keep_seconds / interval))
+        self._active = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def request_started(self):
+        with self._lock:
+            self._active += 1
+        self._wake.set()
+
+    def request_finished(self):
+        with self._lock:
+            self._active -= 1
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            if not self._active:
+                self._wake.wait()
+                self._wake.clear()
+            now = time.perf_counter()
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < 64:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self._samples.append((now, ident, ";".join(reversed(stack))))
+            time.sleep(self.interval)
+
+    def dump(self, route, start, end, total, threads):
+        """Write the samples taken on ``threads`` between start and end."""
+        if self.dumps >= PROFILE_MAX_DUMPS:
+            return
+        folded = Counter(
+            stack
+            for t, ident, stack in list(self._samples)
+            if start <= t <= end and ident in threads
+        )
+        if not folded:
+            return
+        self.dumps += 1
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        name = "".join(c if c.isalnum() else "_" for c in route).strip("_")
+        path = os.path.join(
+            PROFILE_DIR, f"{int(time.time() * 1000)}-{name}-{total * 1000:.0f}ms.folded"
+        )
+        with open(path, "w") as f:
+            for stack, count in folded.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+sampler = StackSampler(PROFILE_SAMPLE_INTERVAL_MS / 1000) if PROFILE_SLOW_MS else None
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        start = time.perf_counter()
+        if sampler:
+            sampler.request_started()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing", stats.server_timing(time.perf_counter() - start)
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            end = time.perf_counter()
+            current_stats.reset(token)
+            route = scope.get("route")
+            name = f"{scope['method']} {route.path if route else '<unmatched>'}"
+            route_windows.record(name, end - start, stats)
+            if sampler:
+                sampler.request_finished()
+                if (end - start) * 1000 >= PROFILE_SLOW_MS:
+                    # file I/O; keep it off the event loop
+                    await run_in_threadpool(
+                        sampler.dump, name, start, end, end - start, stats.threads
+                    )
@@ -0,0 +1,56 @@
+"""Time-decayed "hot" ranking for room questions (``?sort=hot``).
+
+A question's hot score is ``sign(net) * log10(|net|)`` of its net votes plus
+one point for every ``HOT_SCORE_WINDOW`` seconds it was posted after a fixed
+epoch. So a question posted one window later needs ten times fewer net votes
+to rank level with an older one. The time term is fixed when the question
+is posted, which means a score only changes when its votes do. It is stored
+on the row (``Question.hot_score``), refreshed together with the vote
+counters, and the (room_id, hot_score) index serves a room's top questions
+without sorting the room.
+
+Changing ``HOT_SCORE_WINDOW`` only affects scores written afterwards; run
+``python -m app.manage reconcile-votes`` to rescore existing questions.
+"""
+
+import math
+import os
+from datetime import datetime
+
+from sqlalchemy import bindparam, select, update
+
+from . import models
+
+HOT_SCORE_WINDOW = float(os.getenv("HOT_SCORE_WINDOW", "1800"))
+HOT_SCORE_EPOCH = datetime(2025, 1, 1)
+
+
+def hot_score(upvotes: int, downvotes: int, created_at: datetime) -> float:
+    net = upvotes - downvotes
+    sign = (net > 0) - (net < 0)
+    age = ((created_at or HOT_SCORE_EPOCH) - HOT_SCORE_EPOCH).total_seconds()
+    return sign * math.log10(max(abs(net), 1)) + age / HOT_SCORE_WINDOW
+
+
+def refresh_hot_scores(db, question_ids):
+    """Rescore questions whose vote counters just changed. The caller commits."""
+    questions = models.Question.__table__
+    rows = db.execute(
+        select(
+            questions.c.id,
+            questions.c.upvotes,
+            questions.c.downvotes,
+            questions.c.created_at,
+        ).where(questions.c.id.in_(question_ids))
+    ).all()
+    if rows:
+        db.execute(
+            update(questions)
+            .where(questions.c.id == bindparam("qid"))
+            .values(hot_score=bindparam("score")),
+            [
+                {"qid": r.id, "score": hot_score(r.upvotes, r.downvotes, r.created_at)}
+                for r in rows
+            ],
+        )
+    return len(rows)
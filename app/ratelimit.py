@@ -0,0 +1,181 @@
+"""Token-bucket rate limits for the public write endpoints and teacher auth.
+
+Each rule gives every key (a room, a voter_token, a client IP, an email) a
+bucket of ``capacity`` tokens that refills evenly over ``period`` seconds;
+a request takes one token and is refused with 429 + ``Retry-After`` when the
+bucket is empty. Handlers check their rules before touching the database.
+
+Rules are set with ``RATE_LIMIT_<RULE>=<capacity>/<period>`` (``0`` turns a
+rule off), e.g. ``RATE_LIMIT_VOTE_IP=600/60``; ``RATE_LIMITS=off`` disables
+limiting altogether. Client IPs come from the connection, so run uvicorn
+with ``--proxy-headers`` behind a reverse proxy. A whole classroom often
+shares one NAT address, hence the generous per-IP defaults.
+
+Buckets live in a bounded in-process LRU by default, which limits each
+worker separately. Set ``RATE_LIMIT_STORE`` to a SQLite file path on local
+disk to share buckets between all uvicorn workers on the host.
+"""
+
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+
+from . import metrics
+from .cache import TTLCache
+from .concurrency import blocking
+
+RATE_LIMITS = os.getenv("RATE_LIMITS", "on").lower() not in ("0", "off", "false", "no")
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "50000"))
+
+DEFAULT_RULES = {
+    "question_room": "120/60",
+    "question_ip": "60/60",
+    "vote_room": "1200/60",
+    "vote_voter": "60/60",
+    "vote_ip": "600/60",
+    "login_ip": "20/300",
+    "login_email": "5/300",
+    "request_access_ip": "5/3600",
+}
+
+
+def parse_rule(spec):
+    """``"capacity/period"`` -> (capacity, tokens per second), or None if off."""
+    if spec.strip() in ("", "0"):
+        return None
+    capacity, period = spec.split("/")
+    return float(capacity), float(capacity) / float(period)
+
+
+def configured_rules():
+    rules = {}
+    for name, default in DEFAULT_RULES.items():
+        rule = parse_rule(os.getenv(f"RATE_LIMIT_{name.upper()}", default))
+        if rule is not None:
+            rules[name] = rule
+    return rules
+
+
+class MemoryBuckets:
+    def __init__(self, maxsize, ttl):
+        # an idle bucket is full again after ``ttl``, so expiring it is free
+        self._buckets = TTLCache(maxsize, ttl)
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        """Take a token; returns 0 on success, else seconds until one is free."""
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets.set(key, (tokens, now))
+            return wait
+
+
+class SQLiteBuckets:
+    """Buckets in a SQLite file, so every worker on the host shares them."""
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._calls = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL) "
+                "WITHOUT ROWID"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # the buckets are disposable; losing the last writes on a crash is fine
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, capacity, rate):
+        # may wait up to the busy timeout for another worker's write
+        return blocking(self._take, key, capacity, rate)
+
+    def _take(self, key, capacity, rate):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated FROM buckets WHERE key = ?", (key,)
+            ).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, "
+                "updated = excluded.updated",
+                (key, tokens, now),
+            )
+            self._calls += 1
+            if self._calls % 1000 == 0:
+                conn.execute("DELETE FROM buckets WHERE updated < ?", (now - self.ttl,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+
+class RateLimiter:
+    def __init__(self, rules, store_path=None, max_keys=RATE_LIMIT_MAX_KEYS):
+        self.rules = rules
+        ttl = max((capacity / rate for capacity, rate in rules.values()), default=1)
+        if store_path:
+            self.buckets = SQLiteBuckets(store_path, ttl)
+        else:
+            self.buckets = MemoryBuckets(max_keys, ttl)
+
+    def check(self, rule, value):
+        """Spend one of ``value``'s tokens for ``rule``, or raise 429."""
+        if value is None or rule not in self.rules:
+            return
+        capacity, rate = self.rules[rule]
+        wait = self.buckets.take(f"{rule}:{value}", capacity, rate)
+        if wait:
+            metrics.RATE_LIMITED.labels(rule).inc()
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests, slow down",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+    async def check_async(self, rule, value):
+        """``check`` for async endpoints; the SQLite store is queried off the event loop."""
+        if isinstance(self.buckets, SQLiteBuckets):
+            await run_in_threadpool(self.check, rule, value)
+        else:
+            self.check(rule, value)
+
+
+def client_ip(request: Request):
+    return request.client.host if request.client else None
+
+
+limiter = RateLimiter(configured_rules() if RATE_LIMITS else {}, RATE_LIMIT_STORE)
@@ -0,0 +1,72 @@
+"""Cached JSON responses for the hot room read endpoints, with ETags.
+
+Responses are stored under a version stamp (``room-<id>`` or
+``question-<id>``) that every write touching the room/question bumps via
+``invalidate``, so a cached body is never served after a change. The stamps
+are shared by all workers on the host (see cache.py); with
+``CACHE_STAMPS=local`` bodies are only kept for ``LOCAL_STAMP_TTL``. Each body
+carries an ETag (a hash of the body itself, so it agrees across workers);
+clients that send it back in ``If-None-Match`` get an empty 304.
+"""
+
+import hashlib
+import os
+
+from fastapi import Request, Response
+
+from .cache import TTLCache, stamped_ttl, stamps
+from .profiling import TimedJSONResponse, serializing
+from .serialization import dumps
+
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2000"))
+
+responses = TTLCache(RESPONSE_CACHE_SIZE, stamped_ttl(RESPONSE_CACHE_TTL))
+
+
+def room_key(room_id: int) -> str:
+    return f"room-{room_id}"
+
+
+def question_key(question_id: int) -> str:
+    return f"question-{question_id}"
+
+
+def invalidate(room_id=None, question_id=None):
+    if room_id is not None:
+        stamps.bump(room_key(room_id))
+    if question_id is not None:
+        stamps.bump(question_key(question_id))
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [t.strip() for t in if_none_match.split(",")]
+    return "*" in candidates or any(t.removeprefix("W/") == etag for t in candidates)
+
+
+def cached_json(request: Request, stamp_key: str, variant, build):
+    """
+    Serve ``build()`` (a response dict) from the cache for ``stamp_key``.
+    Unsuccessful results are returned as-is and never cached.
+    """
+    # Read the stamp before building so a write racing with the build can
+    # only make the cached entry newer than its stamp, never older.
+    cache_key = (stamp_key, variant, stamps.get(stamp_key))
+    entry = responses.get(cache_key)
+    if entry is None:
+        result = build()
+        if not result.get("success"):
+            return TimedJSONResponse(result)
+        with serializing():
+            body = dumps(result)
+        etag = '"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest()
+        entry = (etag, body)
+        responses.set(cache_key, entry)
+
+    etag, body = entry
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
@@ -1,11 +1,27 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from .. import models, schemas
+from typing import Optional
+from .. import metrics, models, schemas
+from ..archive import archived_question
 from ..deps import get_db, get_current_teacher
+from ..duplicates import duplicates
+from ..events import publish
+from ..response_cache import invalidate
+from ..pagination import paginate, paginate_rows, DEFAULT_PAGE_SIZE
+from ..profiling import TimedJSONResponse
+from ..serialization import columns, dump_all
 
 router = APIRouter(tags=["Answers"])
 
 
+def answer_room_id(db: Session, a: models.Answer) -> int:
+    return (
+        db.query(models.Question.room_id)
+        .filter(models.Question.id == a.question_id)
+        .scalar()
+    )
+
+
 @router.post("/questions/{question_id}/answers")
 def post_answer(
     question_id: int,
@@ -15,8 +31,12 @@ def post_answer(
 ):
     if not teacher:
         return {"success": False, "detail": "Unauthorized"}
-    q = db.query(models.Question).filter(models.Question.id == question_id).first()
-    if not q:
+    room_id = (
+        db.query(models.Question.room_id)
+        .filter(models.Question.id == question_id)
+        .scalar()
+    )
+    if room_id is None:
         return {"success": False, "detail": "Question not found"}
     ans = models.Answer(
         question_id=question_id, teacher_id=teacher.id, content=data.content
@@ -24,18 +44,45 @@ def post_answer(
     db.add(ans)
     db.commit()
     db.refresh(ans)
-    return {"success": True, "answer": schemas.AnswerOut.from_orm(ans)}
+    a_out = schemas.AnswerOut.from_orm(ans)
+    invalidate(question_id=question_id)
+    publish(room_id, "answer_posted", question_id=question_id, answer=a_out)
+    return {"success": True, "answer": a_out}
 
 
 @router.get("/questions/{question_id}/answers")
-def list_answers(question_id: int, db: Session = Depends(get_db)):
-    answers = (
-        db.query(models.Answer).filter(models.Answer.question_id == question_id).all()
+def list_answers(
+    question_id: int,
+    db: Session = Depends(get_db),
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+):
+    query = db.query(*columns(models.Answer, schemas.AnswerOut)).filter(
+        models.Answer.question_id == question_id
+    )
+    order = [models.Answer.created_at, models.Answer.id]
+    try:
+        answers, next_cursor = paginate(query, order, cursor, limit, descending=False)
+        if not answers:
+            # an empty page may mean the question's room was archived
+            snapshot, q = archived_question(db, question_id)
+            if q:
+                answers, next_cursor = paginate_rows(
+                    snapshot.answers_for(question_id),
+                    order,
+                    cursor,
+                    limit,
+                    descending=False,
+                )
+    except ValueError as e:
+        return {"success": False, "detail": str(e)}
+    return TimedJSONResponse(
+        {
+            "success": True,
+            "answers": dump_all(schemas.AnswerOut, answers),
+            "next_cursor": next_cursor,
+        }
     )
-    return {
-        "success": True,
-        "answers": [schemas.AnswerOut.from_orm(a) for a in answers],
-    }
 
 
 @router.patch("/answers/{answer_id}")
@@ -58,7 +105,15 @@ def edit_answer(
     db.add(a)
     db.commit()
     db.refresh(a)
-    return {"success": True, "answer": schemas.AnswerOut.from_orm(a)}
+    a_out = schemas.AnswerOut.from_orm(a)
+    invalidate(question_id=a.question_id)
+    publish(
+        answer_room_id(db, a),
+        "answer_updated",
+        question_id=a.question_id,
+        answer=a_out,
+    )
+    return {"success": True, "answer": a_out}
 
 
 @router.delete("/answers/{answer_id}")
@@ -76,8 +131,12 @@ def delete_answer(
     )
     if not a:
         return {"success": False, "detail": "Answer not found or you're not author"}
+    room_id = answer_room_id(db, a)
+    question_id = a.question_id
     db.delete(a)
     db.commit()
+    invalidate(question_id=question_id)
+    publish(room_id, "answer_deleted", question_id=question_id, answer_id=answer_id)
     return {"success": True, "message": "Answer deleted"}
 
 
@@ -111,4 +170,11 @@ def accept_answer(
     db.add(q)
     db.commit()
     db.refresh(a)
-    return {"success": True, "answer": schemas.AnswerOut.from_orm(a)}
+    db.refresh(q)
+    a_out = schemas.AnswerOut.from_orm(a)
+    metrics.ANSWERS_ACCEPTED.inc()
+    duplicates.remove(q.room_id, q.id)
+    invalidate(room_id=q.room_id, question_id=q.id)
+    publish(q.room_id, "answer_accepted", question_id=q.id, answer=a_out)
+    publish(q.room_id, "question_solved", question=schemas.QuestionOut.from_orm(q))
+    return {"success": True, "answer": a_out}
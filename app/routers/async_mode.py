@@ -0,0 +1,80 @@
+"""
+Async versions of the routers, used when DB_ASYNC is enabled.
+
+Every route keeps a single sync implementation. ``async_router`` wraps each
+one that takes a DB session in an ``async def`` handler that receives an
+AsyncSession and runs the original body through ``AsyncSession.run_sync``.
+The ORM code is unchanged but its I/O is awaited on the async driver, so a
+request no longer occupies a threadpool thread while it waits on the
+database. The bodies run on the event loop thread, so the other blocking
+calls they make (feed NOTIFYs, stamp files, the SQLite rate-limit store)
+go through ``concurrency.blocking``, which runs them on the threadpool.
+"""
+
+import functools
+import inspect
+
+from fastapi import APIRouter, Depends, params
+from fastapi.routing import APIRoute
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..deps import get_db, get_async_db, get_current_teacher, get_current_teacher_async
+
+ASYNC_DEPENDENCIES = {
+    get_db: get_async_db,
+    get_current_teacher: get_current_teacher_async,
+}
+
+
+def async_endpoint(endpoint):
+    signature = inspect.signature(endpoint)
+    session_param = None
+    parameters = []
+    for param in signature.parameters.values():
+        dep = param.default
+        if isinstance(dep, params.Depends) and dep.dependency in ASYNC_DEPENDENCIES:
+            if dep.dependency is get_db:
+                session_param = param.name
+                param = param.replace(annotation=AsyncSession)
+            param = param.replace(default=Depends(ASYNC_DEPENDENCIES[dep.dependency]))
+        parameters.append(param)
+
+    if session_param is None:
+        return None
+
+    @functools.wraps(endpoint)
+    async def wrapper(**kwargs):
+        db = kwargs[session_param]
+        return await db.run_sync(
+            lambda sync_db: endpoint(**{**kwargs, session_param: sync_db})
+        )
+
+    wrapper.__signature__ = signature.replace(parameters=parameters)
+    return wrapper
+
+
+def async_router(router: APIRouter) -> APIRouter:
+    converted = APIRouter()
+    for route in router.routes:
+        endpoint = None
+        if isinstance(route, APIRoute) and not inspect.iscoroutinefunction(
+            route.endpoint
+        ):
+            endpoint = async_endpoint(route.endpoint)
+        if endpoint is None:
+            converted.routes.append(route)
+            continue
+        converted.add_api_route(
+            route.path,
+            endpoint,
+            methods=route.methods,
+            name=route.name,
+            tags=route.tags,
+            summary=route.summary,
+            description=route.description,
+            status_code=route.status_code,
+            response_model=route.response_model,
+            response_class=route.response_class,
+            include_in_schema=route.include_in_schema,
+        )
+    return converted
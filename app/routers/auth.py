@@ -1,105 +1,114 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Header
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Header
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from typing import Optional
-from passlib.context import CryptContext
 import uuid
 
-from ..database import SessionLocal
-from .. import models, schemas
-from ..deps import get_current_teacher
+from .. import metrics, models, schemas
+from ..deps import get_db, get_current_teacher, invalidate_teacher
+from ..passwords import hash_password, verify_password, needs_rehash
+from ..pagination import paginate, DEFAULT_PAGE_SIZE
+from ..ratelimit import client_ip, limiter
 
 router = APIRouter(prefix="/auth/teachers", tags=["Teacher Auth"])
-pwd_context = CryptContext(
-    schemes=["bcrypt"], deprecated="auto", bcrypt__truncate_error=False
-)
 
 ADMIN_SECRET = "adminsecret"
 
 
-def get_db():
-    db = SessionLocal()
+# The endpoints that hash or check passwords are async: they await the bcrypt
+# pool without holding a threadpool thread, and run their DB work on the
+# threadpool through the small sync helpers below. Lookups hand their
+# connection back to the pool before bcrypt runs.
+
+
+def find_teacher(db: Session, email: str):
+    """(id, password_hash) of the teacher with this email, or None."""
     try:
-        yield db
+        return (
+            db.query(models.Teacher.id, models.Teacher.password_hash)
+            .filter(models.Teacher.email == email)
+            .first()
+        )
     finally:
         db.close()
 
 
-def hash_password(pw: str) -> str:
-    if not pw or len(pw) == 0:
-        raise ValueError("Password cannot be empty")
-
-    # Bcrypt has a 72-byte limit. We must truncate BYTES, not characters.
-    # 1. Encode to bytes (utf-8)
-    pw_bytes = pw.encode("utf-8")
-
-    # 2. Truncate if longer than 72 bytes
-    if len(pw_bytes) > 72:
-        pw_bytes = pw_bytes[:72]
+def save_request(db: Session, data: schemas.TeacherRequestCreate, hashed_pw: str):
+    req = models.TeacherRequest(
+        name=data.name, email=data.email, password_hash=hashed_pw
+    )
+    db.add(req)
+    db.commit()
+    db.refresh(req)
+    return req.id
 
-    # 3. Decode back to string for passlib, ignoring any partial multi-byte character at the end
-    # using 'ignore' avoids errors if we cut a unicode char in half.
-    # Note: passlib will encode it again, but now we know it fits!
-    truncated_pw = pw_bytes.decode("utf-8", errors="ignore")
 
-    return pwd_context.hash(truncated_pw)
+def save_teacher(db: Session, data: schemas.TeacherRegister, hashed_pw: str):
+    t = models.Teacher(name=data.name, email=data.email, password_hash=hashed_pw)
+    db.add(t)
+    db.commit()
+    db.refresh(t)
+    return schemas.TeacherOut.from_orm(t)
 
 
-def verify_password(plain: str, hashed: str) -> bool:
-    try:
-        return pwd_context.verify(plain, hashed)
-    except Exception:
-        return False
+def save_login(db: Session, teacher_id: int, token: str, new_hash=None):
+    teacher = db.query(models.Teacher).filter(models.Teacher.id == teacher_id).one()
+    old_token = teacher.token
+    teacher.token = token
+    if new_hash:
+        teacher.password_hash = new_hash
+    db.add(teacher)
+    db.commit()
+    invalidate_teacher(old_token)
+    return schemas.TeacherOut.from_orm(teacher)
 
 
 @router.post("/request-access")
-def request_access(data: schemas.TeacherRequestCreate, db: Session = Depends(get_db)):
+async def request_access(
+    data: schemas.TeacherRequestCreate,
+    request: Request,
+    db: Session = Depends(get_db),
+):
+    await limiter.check_async("request_access_ip", client_ip(request))
     # Hash the password provided by the user
-    hashed_pw = hash_password(data.password)
-    req = models.TeacherRequest(
-        name=data.name, email=data.email, password_hash=hashed_pw
-    )
-    db.add(req)
-    db.commit()
-    db.refresh(req)
-    return {"success": True, "message": "Request submitted", "request_id": req.id}
+    hashed_pw = await hash_password(data.password)
+    req_id = await run_in_threadpool(save_request, db, data, hashed_pw)
+    return {"success": True, "message": "Request submitted", "request_id": req_id}
 
 
 @router.post("/register")
-def register_teacher(
+async def register_teacher(
     data: schemas.TeacherRegister, admin_secret: str = "", db: Session = Depends(get_db)
 ):
     if admin_secret != ADMIN_SECRET:
         return {"success": False, "detail": "Admin secret required"}
-    existing = (
-        db.query(models.Teacher).filter(models.Teacher.email == data.email).first()
-    )
+    existing = await run_in_threadpool(find_teacher, db, data.email)
     if existing:
         return {"success": False, "detail": "Email already registered"}
-    t = models.Teacher(
-        name=data.name, email=data.email, password_hash=hash_password(data.password)
-    )
-    db.add(t)
-    db.commit()
-    db.refresh(t)
-    return {"success": True, "teacher": schemas.TeacherOut.from_orm(t)}
+    hashed_pw = await hash_password(data.password)
+    teacher = await run_in_threadpool(save_teacher, db, data, hashed_pw)
+    return {"success": True, "teacher": teacher}
 
 
 @router.post("/login")
-def login(data: schemas.TeacherLogin, db: Session = Depends(get_db)):
-    teacher = (
-        db.query(models.Teacher).filter(models.Teacher.email == data.email).first()
-    )
-    if not teacher or not verify_password(data.password, teacher.password_hash):
+async def login(
+    data: schemas.TeacherLogin, request: Request, db: Session = Depends(get_db)
+):
+    await limiter.check_async("login_ip", client_ip(request))
+    await limiter.check_async("login_email", data.email.lower())
+    teacher = await run_in_threadpool(find_teacher, db, data.email)
+    if not teacher or not await verify_password(data.password, teacher.password_hash):
+        metrics.LOGINS.labels("failure").inc()
         return {"success": False, "detail": "Invalid credentials"}
+    new_hash = None
+    if needs_rehash(teacher.password_hash):
+        # BCRYPT_ROUNDS changed since this hash was made; upgrade it in place
+        new_hash = await hash_password(data.password)
     token = uuid.uuid4().hex
-    teacher.token = token
-    db.add(teacher)
-    db.commit()
-    return {
-        "success": True,
-        "token": token,
-        "teacher": schemas.TeacherOut.from_orm(teacher),
-    }
+    teacher_out = await run_in_threadpool(save_login, db, teacher.id, token, new_hash)
+    metrics.LOGINS.labels("success").inc()
+    return {"success": True, "token": token, "teacher": teacher_out}
 
 
 @router.get("/me")
@@ -119,9 +128,11 @@ def logout(
 ):
     if not teacher:
         return {"success": False, "detail": "Invalid token or not logged in"}
-    teacher.token = None
-    db.add(teacher)
+    db.query(models.Teacher).filter(models.Teacher.id == teacher.id).update(
+        {"token": None}
+    )
     db.commit()
+    invalidate_teacher(teacher.token)
     return {"success": True, "message": "Logged out"}
 
 
@@ -152,27 +163,45 @@ def check_admin(x_admin_secret: str = Header(...)):
 
 
 @router.get("/requests")
-def list_requests(x_admin_secret: str = Header(...), db: Session = Depends(get_db)):
+def list_requests(
+    x_admin_secret: str = Header(...),
+    db: Session = Depends(get_db),
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    history_cursor: Optional[str] = None,
+):
     if x_admin_secret != ADMIN_SECRET:
         raise HTTPException(status_code=401, detail="Invalid admin secret")
-    pending_reqs = (
-        db.query(models.TeacherRequest)
-        .filter(models.TeacherRequest.approved == False)
-        .order_by(models.TeacherRequest.created_at.desc())
-        .all()
-    )
+    order = [models.TeacherRequest.created_at, models.TeacherRequest.id]
+    try:
+        pending_reqs, next_cursor = paginate(
+            db.query(models.TeacherRequest).filter(
+                models.TeacherRequest.approved == False
+            ),
+            order,
+            cursor,
+            limit,
+        )
+        approved_reqs, history_next_cursor = paginate(
+            db.query(models.TeacherRequest).filter(
+                models.TeacherRequest.approved == True
+            ),
+            order,
+            history_cursor,
+            limit,
+        )
+    except ValueError as e:
+        return {"success": False, "detail": str(e)}
 
-    approved_reqs = (
-        db.query(models.TeacherRequest)
-        .filter(models.TeacherRequest.approved == True)
-        .order_by(models.TeacherRequest.created_at.desc())
+    counts = dict(
+        db.query(models.TeacherRequest.approved, func.count(models.TeacherRequest.id))
+        .group_by(models.TeacherRequest.approved)
         .all()
     )
-
     stats = {
-        "pending": len(pending_reqs),
-        "approved": len(approved_reqs),
-        "total": len(pending_reqs) + len(approved_reqs),
+        "pending": counts.get(False, 0),
+        "approved": counts.get(True, 0),
+        "total": counts.get(False, 0) + counts.get(True, 0),
     }
 
     return {
@@ -180,6 +209,8 @@ def list_requests(x_admin_secret: str = Header(...), db: Session = Depends(get_d
         "requests": pending_reqs,
         "history": approved_reqs,
         "stats": stats,
+        "next_cursor": next_cursor,
+        "history_next_cursor": history_next_cursor,
     }
 
 
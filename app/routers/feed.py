@@ -0,0 +1,89 @@
+import asyncio
+
+from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from .. import models
+from ..database import SessionLocal
+from ..events import broker
+
+router = APIRouter(prefix="/rooms", tags=["Room Feed"])
+
+SSE_KEEPALIVE_SECONDS = 15
+# close code sent to feed clients that fell too far behind
+SLOW_CONSUMER_CLOSE_CODE = 4408
+
+
+def room_exists(room_id: int) -> bool:
+    db = SessionLocal()
+    try:
+        return (
+            db.query(models.Room.id).filter(models.Room.id == room_id).first()
+            is not None
+        )
+    finally:
+        db.close()
+
+
+@router.websocket("/{room_id}/ws")
+async def room_feed_ws(websocket: WebSocket, room_id: int):
+    """
+    Push channel for a room. Clients load GET /rooms/{room_id}/questions once,
+    then apply the incremental events received here.
+    """
+    if not await run_in_threadpool(room_exists, room_id):
+        await websocket.close(code=4404)
+        return
+    await websocket.accept()
+    sub = broker.subscribe(room_id)
+
+    async def forward():
+        while True:
+            message = await sub.get()
+            if message is None:
+                await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+                return
+            await websocket.send_text(message)
+
+    sender = asyncio.create_task(forward())
+    try:
+        # Nothing is expected from the client; receiving just notices the disconnect.
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        broker.unsubscribe(sub)
+
+
+@router.get("/{room_id}/events")
+async def room_feed_sse(room_id: int, request: Request):
+    """Server-Sent Events variant of the room feed, for clients without WebSockets."""
+    if not await run_in_threadpool(room_exists, room_id):
+        return {"success": False, "detail": "Room not found"}
+    sub = broker.subscribe(room_id)
+
+    async def stream():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(
+                        sub.get(), timeout=SSE_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if message is None:
+                    yield "event: dropped\ndata: {}\n\n"
+                    return
+                yield f"data: {message}\n\n"
+        finally:
+            broker.unsubscribe(sub)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
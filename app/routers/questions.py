@@ -1,100 +1,156 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
-from .. import models, schemas
+from typing import Optional
+from datetime import datetime
+from .. import metrics, models, schemas
+from ..archive import archived_question, room_snapshot
 from ..deps import get_db, get_current_teacher
+from ..duplicates import duplicates
+from ..events import publish
+from ..pagination import paginate, paginate_rows, DEFAULT_PAGE_SIZE
+from ..ranking import hot_score
+from ..ratelimit import client_ip, limiter
+from ..response_cache import cached_json, invalidate, room_key, question_key
+from ..serialization import columns, dump, dump_all
 
 router = APIRouter(tags=["Questions"])
 
 
 @router.post("/rooms/{room_id}/questions")
 def post_question(
-    room_id: int, data: schemas.QuestionCreate, db: Session = Depends(get_db)
+    room_id: int,
+    data: schemas.QuestionCreate,
+    request: Request,
+    db: Session = Depends(get_db),
 ):
+    limiter.check("question_ip", client_ip(request))
+    limiter.check("question_room", room_id)
     room = (
-        db.query(models.Room)
+        db.query(models.Room.id)
         .filter(models.Room.id == room_id, models.Room.is_open == True)
         .first()
     )
     if not room:
         return {"success": False, "detail": "Room not found or closed"}
+    similar = duplicates.similar(db, room_id, data.title, data.description)
+    if similar and data.check_duplicates:
+        return {
+            "success": False,
+            "detail": "Similar questions have already been asked",
+            "similar": similar,
+        }
+    now = datetime.utcnow()
     q = models.Question(
         room_id=room_id,
         title=data.title,
         description=data.description,
         student_name=data.student_name,
+        created_at=now,
+        hot_score=hot_score(0, 0, now),
     )
     db.add(q)
     db.commit()
     db.refresh(q)
-    return {"success": True, "question": schemas.QuestionOut.from_orm(q)}
+    q_out = schemas.QuestionOut.from_orm(q)
+    metrics.QUESTIONS_POSTED.inc()
+    duplicates.add(room_id, q.id, q.title, q.description)
+    invalidate(room_id=room_id)
+    publish(room_id, "question_posted", question=q_out)
+    return {"success": True, "question": q_out, "similar": similar}
 
 
 @router.get("/rooms/{room_id}/questions")
 def list_room_questions(
-    room_id: int, db: Session = Depends(get_db), sort: str = "recent"
+    room_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    sort: str = "recent",
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
 ):
-    room = db.query(models.Room).filter(models.Room.id == room_id).first()
-    if not room:
-        return {"success": False, "detail": "Room not found"}
-
-    questions_query = (
-        db.query(models.Question).filter(models.Question.room_id == room_id).all()
+    return cached_json(
+        request,
+        room_key(room_id),
+        ("questions", sort, limit, cursor),
+        lambda: room_questions_page(db, room_id, sort, limit, cursor),
     )
 
-    results = []
-    for q in questions_query:
-        vote_count = (
-            db.query(models.QuestionVote)
-            .filter(
-                models.QuestionVote.question_id == q.id,
-                models.QuestionVote.vote_type == "up",
-            )
-            .count()
-        )
-        q_out = schemas.QuestionOut.from_orm(q)
-        q_out.votes = vote_count
-        results.append(q_out)
+
+def room_questions_page(db: Session, room_id: int, sort, limit, cursor):
+    room = (
+        db.query(models.Room.id, models.Room.is_open)
+        .filter(models.Room.id == room_id)
+        .first()
+    )
+    if not room:
+        return {"success": False, "detail": "Room not found"}
 
     if sort == "votes":
-        results.sort(key=lambda x: x.votes, reverse=True)
+        order = [models.Question.upvotes, models.Question.id]
+    elif sort == "hot":
+        order = [models.Question.hot_score, models.Question.id]
     else:
-        results.sort(key=lambda x: x.created_at, reverse=True)
+        order = [models.Question.created_at, models.Question.id]
+
+    # plain rows, not entities; sort columns outside the schema are selected
+    # too so the keyset cursor can read them back
+    extra = [c for c in order if c.key not in schemas.QuestionOut.model_fields]
+    questions_query = db.query(
+        *columns(models.Question, schemas.QuestionOut), *extra
+    ).filter(models.Question.room_id == room_id)
+    snapshot = room_snapshot(db, room_id) if not room.is_open else None
+    try:
+        if snapshot is not None:
+            questions, next_cursor = paginate_rows(
+                snapshot.questions, order, cursor, limit
+            )
+        else:
+            questions, next_cursor = paginate(questions_query, order, cursor, limit)
+    except ValueError as e:
+        return {"success": False, "detail": str(e)}
 
     return {
         "success": True,
-        "questions": results,
+        "questions": dump_all(schemas.QuestionOut, questions),
+        "next_cursor": next_cursor,
     }
 
 
 @router.get("/questions/{question_id}")
-def get_question(question_id: int, db: Session = Depends(get_db)):
-    q = db.query(models.Question).filter(models.Question.id == question_id).first()
-    if not q:
-        return {"success": False, "detail": "Question not found"}
-
-    votes = (
-        db.query(models.QuestionVote)
-        .filter(
-            models.QuestionVote.question_id == q.id,
-            models.QuestionVote.vote_type == "up",
-        )
-        .count()
+def get_question(question_id: int, request: Request, db: Session = Depends(get_db)):
+    return cached_json(
+        request,
+        question_key(question_id),
+        "detail",
+        lambda: question_detail(db, question_id),
     )
 
-    answers = (
-        db.query(models.Answer)
-        .filter(models.Answer.question_id == q.id)
-        .order_by(models.Answer.created_at.asc())
-        .all()
-    )
 
-    q_out = schemas.QuestionOut.from_orm(q)
-    q_out.votes = votes
+def question_detail(db: Session, question_id: int):
+    q = (
+        db.query(*columns(models.Question, schemas.QuestionOut))
+        .filter(models.Question.id == question_id)
+        .first()
+    )
+    if q:
+        answers = (
+            db.query(*columns(models.Answer, schemas.AnswerOut))
+            .filter(models.Answer.question_id == q.id)
+            .order_by(models.Answer.created_at.asc())
+            .all()
+        )
+    else:
+        snapshot, q = archived_question(db, question_id)
+        if not q:
+            return {"success": False, "detail": "Question not found"}
+        answers = sorted(
+            snapshot.answers_for(question_id), key=lambda a: (a.created_at, a.id)
+        )
 
     return {
         "success": True,
-        "question": q_out,
-        "answers": [schemas.AnswerOut.from_orm(a) for a in answers],
+        "question": dump(schemas.QuestionOut, q),
+        "answers": dump_all(schemas.AnswerOut, answers),
     }
 
 
@@ -120,7 +176,12 @@ def edit_question(
     db.add(q)
     db.commit()
     db.refresh(q)
-    return {"success": True, "question": schemas.QuestionOut.from_orm(q)}
+    q_out = schemas.QuestionOut.from_orm(q)
+    if not q.is_solved:
+        duplicates.add(q.room_id, q.id, q.title, q.description)
+    invalidate(room_id=q.room_id, question_id=question_id)
+    publish(q.room_id, "question_updated", question=q_out)
+    return {"success": True, "question": q_out}
 
 
 @router.delete("/questions/{question_id}")
@@ -139,14 +200,18 @@ def delete_question(
     )
     if not q:
         return {"success": False, "detail": "Question not found or you're not owner"}
+    room_id = q.room_id
     db.delete(q)
     db.commit()
+    duplicates.remove(room_id, question_id)
+    invalidate(room_id=room_id, question_id=question_id)
+    publish(room_id, "question_deleted", question_id=question_id)
     return {"success": True, "message": "Question deleted"}
 
 
 @router.post("/questions/{question_id}/report")
 def report_question(question_id: int, db: Session = Depends(get_db)):
-    q = db.query(models.Question).filter(models.Question.id == question_id).first()
+    q = db.query(models.Question.id).filter(models.Question.id == question_id).first()
     if not q:
         return {"success": False, "detail": "Question not found"}
     return {"success": True, "message": "Reported (admin will review)"}
@@ -172,4 +237,8 @@ def mark_solved(
     db.add(q)
     db.commit()
     db.refresh(q)
-    return {"success": True, "question": schemas.QuestionOut.from_orm(q)}
+    q_out = schemas.QuestionOut.from_orm(q)
+    duplicates.remove(q.room_id, question_id)
+    invalidate(room_id=q.room_id, question_id=question_id)
+    publish(q.room_id, "question_solved", question=q_out)
+    return {"success": True, "question": q_out}
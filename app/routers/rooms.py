@@ -1,15 +1,83 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-import uuid
+from typing import Optional
+import os
+import secrets
 
-from .. import models, schemas
+from .. import metrics, models, schemas
+from ..archive import drop_archive
+from ..cache import TTLCache, stamped_ttl, stamps
 from ..deps import get_db, get_current_teacher
+from ..duplicates import duplicates
+from ..events import publish
+from ..response_cache import invalidate
+from ..pagination import paginate, DEFAULT_PAGE_SIZE
+from ..profiling import TimedJSONResponse
+from ..serialization import columns, dump, dump_all
 
 router = APIRouter(prefix="/rooms", tags=["Rooms"])
 
+# Codes avoid look-alike characters (0/O, 1/I/L). 31**6 is ~887M codes; raise
+# ROOM_CODE_LENGTH if collisions (questup_room_code_collisions_total) climb.
+ROOM_CODE_ALPHABET = "23456789ABCDEFGHJKMNPQRSTUVWXYZ"
+ROOM_CODE_LENGTH = int(os.getenv("ROOM_CODE_LENGTH", "6"))
+ROOM_CODE_ATTEMPTS = 8
+
+ROOM_CODE_CACHE_TTL = float(os.getenv("ROOM_CODE_CACHE_TTL", "300"))
+ROOM_CODE_MISS_TTL = float(os.getenv("ROOM_CODE_MISS_TTL", "5"))
+ROOM_CODE_CACHE_SIZE = int(os.getenv("ROOM_CODE_CACHE_SIZE", "10000"))
+
+# room_code -> (open room as a RoomOut dict, or None, version stamp). Misses
+# are kept briefly in their own LRU so guessed codes cannot evict real rooms.
+# A close or delete on any worker bumps the shared stamp; with process-local
+# stamps, entries expire within LOCAL_STAMP_TTL instead.
+room_codes = TTLCache(ROOM_CODE_CACHE_SIZE, stamped_ttl(ROOM_CODE_CACHE_TTL))
+room_code_misses = TTLCache(ROOM_CODE_CACHE_SIZE, stamped_ttl(ROOM_CODE_MISS_TTL))
+
+
+def room_code_key(code: str) -> str:
+    return f"room-code-{code}"
+
+
+def refresh_room_code(code: str, room: Optional[dict] = None):
+    """Point join_by_code at ``room``'s new state, or forget ``code`` if None."""
+    key = room_code_key(code)
+    stamps.bump(key)
+    room_code_misses.pop(code)
+    if room is not None and room["is_open"]:
+        room_codes.set(code, (room, stamps.get(key)))
+    else:
+        room_codes.pop(code)
+
+
+def lookup_room_code(db: Session, code: str):
+    """The open room with ``code`` as a RoomOut dict, or None."""
+    if not isinstance(code, str) or not code.isalnum():
+        # room codes are alphanumeric; anything else also must not reach
+        # the stamp file name
+        return None
+    # read the stamp before querying, as in response_cache.cached_json
+    stamp = stamps.get(room_code_key(code))
+    for cache in (room_codes, room_code_misses):
+        cached = cache.get(code)
+        if cached is not None and cached[1] == stamp:
+            return cached[0]
+    room = (
+        db.query(*columns(models.Room, schemas.RoomOut))
+        .filter(models.Room.room_code == code, models.Room.is_open == True)
+        .first()
+    )
+    if room is None:
+        room_code_misses.set(code, (None, stamp))
+        return None
+    room = dump(schemas.RoomOut, room)
+    room_codes.set(code, (room, stamp))
+    return room
+
 
-def gen_room_code():
-    return uuid.uuid4().hex[:6].upper()
+def gen_room_code(length=ROOM_CODE_LENGTH):
+    return "".join(secrets.choice(ROOM_CODE_ALPHABET) for _ in range(length))
 
 
 @router.post("")
@@ -20,31 +88,60 @@ def create_room(
 ):
     if not teacher:
         return {"success": False, "detail": "Unauthorized"}
-    code = gen_room_code()
-    while db.query(models.Room).filter(models.Room.room_code == code).first():
+    # Let the unique index on room_code catch the rare collision instead of
+    # checking for the code first: one INSERT per room in the common case.
+    for _ in range(ROOM_CODE_ATTEMPTS):
         code = gen_room_code()
-
-    room = models.Room(
-        title=data.title,
-        subject_id=data.subject_id,
-        room_code=code,
-        owner_id=teacher.id,
-    )
-    db.add(room)
-    db.commit()
+        metrics.ROOM_CODES_TRIED.inc()
+        room = models.Room(
+            title=data.title,
+            subject_id=data.subject_id,
+            room_code=code,
+            owner_id=teacher.id,
+        )
+        db.add(room)
+        try:
+            db.commit()
+            break
+        except IntegrityError:
+            db.rollback()
+            taken = db.query(models.Room.id).filter(models.Room.room_code == code)
+            if not taken.first():
+                raise
+            metrics.ROOM_CODE_COLLISIONS.inc()
+    else:
+        raise HTTPException(status_code=503, detail="Could not allocate a room code")
     db.refresh(room)
-    return schemas.RoomOut.from_orm(room)
+    room_out = schemas.RoomOut.from_orm(room)
+    refresh_room_code(room.room_code, room_out.model_dump())
+    return room_out
 
 
 @router.get("")
 def list_rooms(
     db: Session = Depends(get_db),
     teacher: models.Teacher = Depends(get_current_teacher),
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
 ):
     if not teacher:
         return {"success": False, "detail": "Unauthorized"}
-    rooms = db.query(models.Room).filter(models.Room.owner_id == teacher.id).all()
-    return {"success": True, "rooms": [schemas.RoomOut.from_orm(r) for r in rooms]}
+    query = db.query(*columns(models.Room, schemas.RoomOut)).filter(
+        models.Room.owner_id == teacher.id
+    )
+    try:
+        rooms, next_cursor = paginate(
+            query, [models.Room.created_at, models.Room.id], cursor, limit
+        )
+    except ValueError as e:
+        return {"success": False, "detail": str(e)}
+    return TimedJSONResponse(
+        {
+            "success": True,
+            "rooms": dump_all(schemas.RoomOut, rooms),
+            "next_cursor": next_cursor,
+        }
+    )
 
 
 @router.get("/{room_id}")
@@ -86,7 +183,9 @@ def update_room(
     db.add(room)
     db.commit()
     db.refresh(room)
-    return {"success": True, "room": schemas.RoomOut.from_orm(room)}
+    room_out = schemas.RoomOut.from_orm(room)
+    refresh_room_code(room.room_code, room_out.model_dump())
+    return {"success": True, "room": room_out}
 
 
 @router.delete("/{room_id}")
@@ -104,8 +203,16 @@ def delete_room(
     )
     if not room:
         return {"success": False, "detail": "Room not found"}
+    code = room.room_code
+    archived_ids = drop_archive(db, room_id)
     db.delete(room)
     db.commit()
+    refresh_room_code(code)
+    duplicates.drop_room(room_id)
+    invalidate(room_id=room_id)
+    for qid in archived_ids:
+        invalidate(question_id=qid)
+    publish(room_id, "room_deleted")
     return {"success": True, "message": "Room deleted"}
 
 
@@ -128,7 +235,10 @@ def close_room(
     db.add(room)
     db.commit()
     db.refresh(room)
-    return {"success": True, "room": schemas.RoomOut.from_orm(room)}
+    room_out = schemas.RoomOut.from_orm(room)
+    refresh_room_code(room.room_code)
+    publish(room_id, "room_closed", room=room_out)
+    return {"success": True, "room": room_out}
 
 
 @router.post("/join")
@@ -136,11 +246,7 @@ def join_by_code(payload: dict, db: Session = Depends(get_db)):
     code = payload.get("room_code")
     if not code:
         return {"success": False, "detail": "room_code required"}
-    room = (
-        db.query(models.Room)
-        .filter(models.Room.room_code == code, models.Room.is_open == True)
-        .first()
-    )
+    room = lookup_room_code(db, code)
     if not room:
         return {"success": False, "detail": "Room not found or closed"}
-    return {"success": True, "room": schemas.RoomOut.from_orm(room)}
+    return {"success": True, "room": room}
@@ -0,0 +1,102 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from typing import Optional
+from operator import attrgetter
+from .. import models, schemas
+from ..archive import room_snapshot
+from ..deps import get_db, get_current_teacher
+from ..pagination import (
+    clamp_limit,
+    encode_cursor,
+    paginate,
+    paginate_rows,
+    DEFAULT_PAGE_SIZE,
+)
+from ..profiling import TimedJSONResponse
+from ..search import search_hits, search_terms
+from ..serialization import columns, dump_all
+
+router = APIRouter(tags=["Search"])
+
+
+class ArchivedHit:
+    """A snapshot question matched by search; reads through to the question."""
+
+    __slots__ = ("rank", "question")
+
+    def __init__(self, score, question):
+        # live ranks are positive, so (-1, 0) sorts archived hits after them
+        self.rank = -1 / (1 + score)
+        self.question = question
+
+    def __getattr__(self, name):
+        return getattr(self.question, name)
+
+
+def archived_hits(db: Session, terms, room_ids):
+    archived_rooms = db.query(models.RoomArchive.room_id).filter(
+        models.RoomArchive.room_id.in_(room_ids)
+    )
+    hits = []
+    for (rid,) in archived_rooms:
+        snapshot = room_snapshot(db, rid)
+        if snapshot is not None:
+            hits.extend(ArchivedHit(*hit) for hit in snapshot.search(terms))
+    return hits
+
+
+@router.get("/search")
+def search_questions(
+    q: str,
+    room_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    teacher: models.Teacher = Depends(get_current_teacher),
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+):
+    """
+    Questions matching ``q`` in their title, description or answers, best
+    match first. Scoped to ``room_id`` if given, else to all of the
+    teacher's rooms; either way only the teacher's own rooms are searched.
+    """
+    if not teacher:
+        return {"success": False, "detail": "Unauthorized"}
+    terms = search_terms(q)
+    if not terms:
+        return {"success": False, "detail": "q must contain at least one word"}
+    rooms = db.query(models.Room.id).filter(models.Room.owner_id == teacher.id)
+    if room_id is not None:
+        rooms = rooms.filter(models.Room.id == room_id)
+    room_ids = [rid for (rid,) in rooms]
+    if room_id is not None and not room_ids:
+        return {"success": False, "detail": "Room not found"}
+
+    hits = search_hits(db.get_bind().dialect.name, terms, room_ids)
+    query = db.query(*columns(models.Question, schemas.QuestionOut), hits.c.rank).join(
+        hits, hits.c.question_id == models.Question.id
+    )
+    order = [hits.c.rank, models.Question.id]
+    limit = clamp_limit(limit)
+    try:
+        questions, next_cursor = paginate(query, order, cursor, limit)
+        if next_cursor is None:
+            # archived hits rank below every live one; only a page with room
+            # left reaches them
+            archived, archived_cursor = paginate_rows(
+                archived_hits(db, terms, room_ids), order, cursor, limit
+            )
+            questions = sorted(
+                [*questions, *archived], key=attrgetter("rank", "id"), reverse=True
+            )
+            if archived_cursor or len(questions) > limit:
+                questions = questions[:limit]
+                next_cursor = encode_cursor([questions[-1].rank, questions[-1].id])
+    except ValueError as e:
+        return {"success": False, "detail": str(e)}
+    return TimedJSONResponse(
+        {
+            "success": True,
+            "questions": dump_all(schemas.QuestionOut, questions),
+            "next_cursor": next_cursor,
+        }
+    )
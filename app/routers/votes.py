@@ -1,45 +1,176 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from .. import models, schemas
+from typing import Optional
+from .. import metrics, models, schemas
+from ..archive import archived_question
 from ..deps import get_db
+from ..events import publish
+from ..ranking import refresh_hot_scores
+from ..ratelimit import client_ip, limiter
+from ..response_cache import invalidate
+from ..vote_batcher import VOTE_BATCHING, batcher
 
 router = APIRouter(tags=["Votes"])
 
 
+def cast_vote(
+    db: Session, question_id: int, voter_token: str, vote_type: Optional[str]
+):
+    """
+    Record, change or (vote_type=None) withdraw a voter's vote and keep the
+    question's counters in step. Returns the vote row (None once withdrawn)
+    and whether anything changed. The caller commits.
+    """
+    existing = (
+        db.query(models.QuestionVote)
+        .filter(
+            models.QuestionVote.question_id == question_id,
+            models.QuestionVote.voter_token == voter_token,
+        )
+        .with_for_update()
+        .first()
+    )
+    if existing is not None and existing.vote_type == vote_type:
+        return existing, False
+    if existing is None and vote_type is None:
+        return None, False
+
+    deltas = {"up": 0, "down": 0}
+    vote = existing
+    if existing is not None:
+        deltas[existing.vote_type] -= 1
+        if vote_type is None:
+            db.delete(existing)
+            vote = None
+        else:
+            existing.vote_type = vote_type
+    else:
+        vote = models.QuestionVote(
+            question_id=question_id, voter_token=voter_token, vote_type=vote_type
+        )
+        db.add(vote)
+    if vote_type is not None:
+        deltas[vote_type] += 1
+
+    db.query(models.Question).filter(models.Question.id == question_id).update(
+        {
+            models.Question.upvotes: models.Question.upvotes + deltas["up"],
+            models.Question.downvotes: models.Question.downvotes + deltas["down"],
+        },
+        synchronize_session=False,
+    )
+    refresh_hot_scores(db, [question_id])
+    return vote, True
+
+
+def limit_votes(request: Request, voter_token):
+    # the per-room limit needs the question's room and is checked once known
+    limiter.check("vote_ip", client_ip(request))
+    limiter.check("vote_voter", voter_token)
+
+
+def question_room_id(db: Session, question_id: int):
+    return (
+        db.query(models.Question.room_id)
+        .filter(models.Question.id == question_id)
+        .scalar()
+    )
+
+
+def commit_vote(db: Session, question_id: int, room_id: int, voter_token, vote_type):
+    try:
+        vote, changed = cast_vote(db, question_id, voter_token, vote_type)
+        db.commit()
+    except IntegrityError:
+        # the same voter's first vote raced in from another request; retry
+        # now that their row exists
+        db.rollback()
+        vote, changed = cast_vote(db, question_id, voter_token, vote_type)
+        db.commit()
+    vote_id = vote.id if vote is not None else None
+    if changed:
+        metrics.VOTES_CAST.labels(vote_type or "withdrawn").inc()
+        up, down = (
+            db.query(models.Question.upvotes, models.Question.downvotes)
+            .filter(models.Question.id == question_id)
+            .one()
+        )
+        invalidate(room_id=room_id, question_id=question_id)
+        publish(room_id, "vote_changed", question_id=question_id, up=up, down=down)
+    return vote_id, changed
+
+
 @router.post("/questions/{question_id}/vote")
 def vote_question(
-    question_id: int, data: schemas.VoteCreate, db: Session = Depends(get_db)
+    question_id: int,
+    data: schemas.VoteCreate,
+    request: Request,
+    db: Session = Depends(get_db),
 ):
-    q = db.query(models.Question).filter(models.Question.id == question_id).first()
-    if not q:
+    # one vote per voter: a vote without a voter_token cannot be deduplicated
+    voter_token = data.voter_token
+    if not voter_token:
+        return {"success": False, "detail": "voter_token required"}
+    limit_votes(request, voter_token)
+    if VOTE_BATCHING:
+        return queue_vote(question_id, voter_token, data.vote_type, db)
+    room_id = question_room_id(db, question_id)
+    if room_id is None:
         return {"success": False, "detail": "Question not found"}
+    limiter.check("vote_room", room_id)
     if data.vote_type not in ("up", "down"):
         return {"success": False, "detail": "vote_type must be 'up' or 'down'"}
-    v = models.QuestionVote(
-        question_id=question_id, voter_token=data.voter_token, vote_type=data.vote_type
-    )
-    db.add(v)
-    db.commit()
-    db.refresh(v)
-    return {"success": True, "vote_id": v.id}
+    vote_id, _ = commit_vote(db, question_id, room_id, voter_token, data.vote_type)
+    return {"success": True, "vote_id": vote_id}
+
+
+@router.delete("/questions/{question_id}/vote")
+def unvote_question(
+    question_id: int,
+    request: Request,
+    voter_token: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    if not voter_token:
+        return {"success": False, "detail": "voter_token required"}
+    limit_votes(request, voter_token)
+    if VOTE_BATCHING:
+        return queue_vote(question_id, voter_token, None, db)
+    room_id = question_room_id(db, question_id)
+    if room_id is None:
+        return {"success": False, "detail": "Question not found"}
+    limiter.check("vote_room", room_id)
+    _, removed = commit_vote(db, question_id, room_id, voter_token, None)
+    return {"success": True, "removed": removed}
+
+
+def queue_vote(question_id: int, voter_token, vote_type, db: Session):
+    room_id = question_room_id(db, question_id)
+    if room_id is None:
+        return {"success": False, "detail": "Question not found"}
+    limiter.check("vote_room", room_id)
+    if vote_type not in ("up", "down", None):
+        return {"success": False, "detail": "vote_type must be 'up' or 'down'"}
+    if not batcher.submit(room_id, question_id, vote_type, voter_token):
+        raise HTTPException(
+            status_code=503,
+            detail="Too many votes in flight, retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    # the row id is not known until the batch is written
+    return {"success": True, "vote_id": None, "queued": True}
 
 
 @router.get("/questions/{question_id}/votes")
 def get_question_votes(question_id: int, db: Session = Depends(get_db)):
-    up = (
-        db.query(models.QuestionVote)
-        .filter(
-            models.QuestionVote.question_id == question_id,
-            models.QuestionVote.vote_type == "up",
-        )
-        .count()
-    )
-    down = (
-        db.query(models.QuestionVote)
-        .filter(
-            models.QuestionVote.question_id == question_id,
-            models.QuestionVote.vote_type == "down",
-        )
-        .count()
+    counts = (
+        db.query(models.Question.upvotes, models.Question.downvotes)
+        .filter(models.Question.id == question_id)
+        .first()
     )
+    if counts is None:
+        _, q = archived_question(db, question_id)
+        counts = (q.upvotes, q.downvotes) if q else None
+    up, down = counts if counts else (0, 0)
     return {"success": True, "question_id": question_id, "up": up, "down": down}
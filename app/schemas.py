@@ -64,6 +64,8 @@ class QuestionCreate(BaseModel):
     title: str
     description: Optional[str] = None
     student_name: Optional[str] = None
+    # when set, a question with likely duplicates is not posted
+    check_duplicates: bool = False
 
 
 class QuestionOut(BaseModel):
@@ -0,0 +1,172 @@
+"""Full-text search over question titles/descriptions and answer contents.
+
+The text index is backend-specific and maintained by the database itself, so
+every insert, edit and delete is reflected immediately:
+
+* PostgreSQL: GIN indexes on ``to_tsvector('english', ...)`` expressions,
+  ranked with ``ts_rank``.
+* SQLite: FTS5 external-content tables (porter stemming) kept in step by
+  triggers, ranked with ``bm25``.
+
+``ensure_search_index`` creates whatever is missing. It runs only from
+``python -m app.manage migrate``, once per deployment before the workers
+start; on PostgreSQL it builds the indexes ``CONCURRENTLY`` so writes carry
+on meanwhile. ``search_hits`` returns a subquery of (question_id, rank) with
+one row per matching question, where a question matches through its own
+text or any of its answers.
+"""
+
+import re
+
+from sqlalchemy import Float, Integer, bindparam, text
+
+SEARCH_MAX_TERMS = 16
+
+QUESTION_TSV = "to_tsvector('english', title || ' ' || coalesce(description, ''))"
+ANSWER_TSV = "to_tsvector('english', content)"
+
+POSTGRES_INDEXES = {
+    "ix_questions_search": f"ON questions USING GIN ({QUESTION_TSV})",
+    "ix_answers_search": f"ON answers USING GIN ({ANSWER_TSV})",
+}
+
+SQLITE_OBJECTS = {
+    "questions_fts": "TABLE",
+    "questions_fts_insert": "TRIGGER",
+    "questions_fts_delete": "TRIGGER",
+    "questions_fts_update": "TRIGGER",
+    "answers_fts": "TABLE",
+    "answers_fts_insert": "TRIGGER",
+    "answers_fts_delete": "TRIGGER",
+    "answers_fts_update": "TRIGGER",
+}
+
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE questions_fts USING fts5(
+        title, description, content='questions', content_rowid='id',
+        tokenize='porter unicode61')""",
+    """CREATE TRIGGER questions_fts_insert AFTER INSERT ON questions BEGIN
+        INSERT INTO questions_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER questions_fts_delete AFTER DELETE ON questions BEGIN
+        INSERT INTO questions_fts(questions_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER questions_fts_update AFTER UPDATE OF title, description
+    ON questions BEGIN
+        INSERT INTO questions_fts(questions_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO questions_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END""",
+    "INSERT INTO questions_fts(questions_fts) VALUES ('rebuild')",
+    """CREATE VIRTUAL TABLE answers_fts USING fts5(
+        content, content='answers', content_rowid='id',
+        tokenize='porter unicode61')""",
+    """CREATE TRIGGER answers_fts_insert AFTER INSERT ON answers BEGIN
+        INSERT INTO answers_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE TRIGGER answers_fts_delete AFTER DELETE ON answers BEGIN
+        INSERT INTO answers_fts(answers_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+    END""",
+    """CREATE TRIGGER answers_fts_update AFTER UPDATE OF content ON answers BEGIN
+        INSERT INTO answers_fts(answers_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+        INSERT INTO answers_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+    "INSERT INTO answers_fts(answers_fts) VALUES ('rebuild')",
+]
+
+POSTGRES_HITS = f"""
+    SELECT question_id, MAX(rank) AS rank FROM (
+        SELECT q.id AS question_id,
+               ts_rank({QUESTION_TSV}, plainto_tsquery('english', :terms)) AS rank
+        FROM questions q
+        WHERE {QUESTION_TSV} @@ plainto_tsquery('english', :terms)
+          AND q.room_id IN :room_ids
+        UNION ALL
+        SELECT a.question_id,
+               ts_rank({ANSWER_TSV}, plainto_tsquery('english', :terms))
+        FROM answers a JOIN questions q ON q.id = a.question_id
+        WHERE {ANSWER_TSV} @@ plainto_tsquery('english', :terms)
+          AND q.room_id IN :room_ids
+    ) matches GROUP BY question_id
+"""
+
+# bm25() is lower-is-better; negate it so both backends rank descending.
+# Title matches weigh more than description matches.
+SQLITE_HITS = """
+    SELECT question_id, MAX(rank) AS rank FROM (
+        SELECT q.id AS question_id, -bm25(questions_fts, 4.0, 1.0) AS rank
+        FROM questions_fts JOIN questions q ON q.id = questions_fts.rowid
+        WHERE questions_fts MATCH :terms AND q.room_id IN :room_ids
+        UNION ALL
+        SELECT a.question_id, -bm25(answers_fts)
+        FROM answers_fts
+        JOIN answers a ON a.id = answers_fts.rowid
+        JOIN questions q ON q.id = a.question_id
+        WHERE answers_fts MATCH :terms AND q.room_id IN :room_ids
+    ) GROUP BY question_id
+"""
+
+
+def ensure_search_index(engine):
+    """Create the text index for this backend if missing; returns True if created."""
+    backend = engine.dialect.name
+    if backend == "postgresql":
+        created = False
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+        with engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT")
+            for name, definition in POSTGRES_INDEXES.items():
+                valid = conn.execute(
+                    text(
+                        "SELECT indisvalid FROM pg_index "
+                        "WHERE indexrelid = to_regclass(CAST(:name AS text))"
+                    ),
+                    {"name": name},
+                ).scalar()
+                if valid:
+                    continue
+                if valid is False:
+                    # left behind by an interrupted concurrent build
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY {name}"))
+                conn.execute(text(f"CREATE INDEX CONCURRENTLY {name} {definition}"))
+                created = True
+        return created
+    if backend == "sqlite":
+        with engine.begin() as conn:
+            existing = set(
+                conn.execute(text("SELECT name FROM sqlite_master")).scalars()
+            )
+            if existing >= SQLITE_OBJECTS.keys():
+                return False
+            # Recreating the questions/answers tables drops the triggers but not
+            # the FTS tables, so start over and rebuild from the live rows.
+            for name, kind in SQLITE_OBJECTS.items():
+                conn.execute(text(f"DROP {kind} IF EXISTS {name}"))
+            for statement in SQLITE_DDL:
+                conn.execute(text(statement))
+        return True
+    raise ValueError(f"Search is not supported for {backend} databases")
+
+
+def search_terms(query: str):
+    """The words of a user query, safe to hand to either backend."""
+    return re.findall(r"\w+", query or "")[:SEARCH_MAX_TERMS]
+
+
+def search_hits(backend: str, terms, room_ids):
+    """Subquery of (question_id, rank) for questions in ``room_ids`` matching all terms."""
+    if backend == "postgresql":
+        sql, value = POSTGRES_HITS, " ".join(terms)
+    else:
+        sql, value = SQLITE_HITS, " ".join(f'"{t}"' for t in terms)
+    return (
+        text(sql)
+        .bindparams(bindparam("room_ids", list(room_ids), expanding=True), terms=value)
+        .columns(question_id=Integer, rank=Float)
+        .subquery("hits")
+    )
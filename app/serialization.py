@@ -0,0 +1,38 @@
+"""Fast JSON encoding for API responses.
+
+List endpoints skip Pydantic for rows that come straight out of the
+database: they select just ``columns(model, schema)``, ``dump_all`` copies
+the schema's fields off those rows (or ORM objects) into plain dicts, and
+``dumps`` encodes them with orjson instead of ``jsonable_encoder`` +
+``json.dumps``. The bytes on the wire are the same as before (compact
+separators, UTF-8, ``isoformat()`` datetimes).
+"""
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+
+def _default(obj):
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    return jsonable_encoder(obj)
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default)
+
+
+def columns(model, schema) -> list:
+    """The columns of ``model`` that ``schema`` needs, for column-only queries."""
+    return [getattr(model, name).label(name) for name in schema.model_fields]
+
+
+def dump(schema, obj) -> dict:
+    """``schema.from_orm(obj)`` as a dict, without validation."""
+    return {name: getattr(obj, name) for name in schema.model_fields}
+
+
+def dump_all(schema, objs) -> list:
+    names = tuple(schema.model_fields)
+    return [{name: getattr(obj, name) for name in names} for obj in objs]
@@ -0,0 +1,330 @@
+"""Batched vote ingestion, enabled with ``VOTE_BATCHING=1``.
+
+``vote_question`` validates the request and hands the vote to ``batcher``
+instead of writing it. A background thread drains the queue every
+``VOTE_BATCH_INTERVAL_MS`` (or as soon as ``VOTE_BATCH_SIZE`` votes are
+waiting) and writes the whole batch in one transaction: a multi-row insert
+into question_votes (changed or withdrawn votes become updates/deletes, one
+vote per voter per question) plus one counter update per affected question.
+Commit latency is then paid per batch instead of per click.
+
+Votes accepted into the queue are flushed on shutdown (``stop``). Votes
+for a question deleted or archived after they were queued are skipped. A
+batch that fails to commit is retried a few times, then written in halves
+so that only the votes that fail on their own are logged and dropped.
+The queue depth and the flushed/dropped vote counts are exported in
+``/metrics`` (``questup_vote_queue_depth``, ``questup_votes_*_total``).
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import (
+    DateTime,
+    Integer,
+    String,
+    bindparam,
+    delete,
+    exists,
+    insert,
+    select,
+    update,
+)
+
+from . import metrics
+from .database import SessionLocal
+from .events import publish
+from .ranking import refresh_hot_scores
+from .response_cache import invalidate
+from . import models
+
+logger = logging.getLogger(__name__)
+
+VOTE_BATCHING = os.getenv("VOTE_BATCHING", "").lower() in ("1", "true", "yes")
+VOTE_BATCH_SIZE = int(os.getenv("VOTE_BATCH_SIZE", "500"))
+VOTE_BATCH_INTERVAL_MS = float(os.getenv("VOTE_BATCH_INTERVAL_MS", "10"))
+VOTE_QUEUE_SIZE = int(os.getenv("VOTE_QUEUE_SIZE", "20000"))
+VOTE_FLUSH_RETRIES = 3
+
+
+class VoteBatcher:
+    def __init__(
+        self,
+        batch_size=VOTE_BATCH_SIZE,
+        interval=VOTE_BATCH_INTERVAL_MS / 1000,
+        queue_size=VOTE_QUEUE_SIZE,
+    ):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.flushed = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stopping = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="vote-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self):
+        """Stop the flusher after writing every vote already accepted."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._drain()
+
+    def submit(self, room_id, question_id, vote_type, voter_token):
+        """Queue one vote. Returns False when the queue is full."""
+        self.start()
+        try:
+            self._queue.put_nowait(
+                {
+                    "room_id": room_id,
+                    "question_id": question_id,
+                    "vote_type": vote_type,
+                    "voter_token": voter_token,
+                    "created_at": datetime.utcnow(),
+                }
+            )
+        except queue.Full:
+            return False
+        metrics.VOTE_QUEUE_DEPTH.inc()
+        return True
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._take(self.interval)
+            if batch:
+                self._flush(batch)
+
+    def _drain(self):
+        while True:
+            batch = self._take(0)
+            if not batch:
+                return
+            self._flush(batch)
+
+    def _take(self, wait):
+        batch = []
+        try:
+            batch.append(
+                self._queue.get(timeout=wait) if wait else self._queue.get_nowait()
+            )
+        except queue.Empty:
+            return batch
+        deadline = time.monotonic() + wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        metrics.VOTE_QUEUE_DEPTH.dec(len(batch))
+        return batch
+
+    def _flush(self, batch):
+        for attempt in range(1, VOTE_FLUSH_RETRIES + 1):
+            try:
+                rooms = self.write_batch(batch)
+            except Exception:
+                logger.exception(
+                    "vote batch of %d failed (attempt %d)", len(batch), attempt
+                )
+                time.sleep(0.05 * attempt)
+            else:
+                self._count_flushed(len(batch))
+                break
+        else:
+            rooms = self._write_halves(batch)
+        if not rooms:
+            return
+        try:
+            self.announce(rooms)
+        except Exception:
+            # the votes are committed; only the cache/feed refresh was lost
+            logger.exception("failed to announce vote batch")
+
+    def _write_halves(self, batch):
+        """
+        Write a batch that keeps failing in two halves, recursing into a half
+        that fails too, so one bad vote does not take its batch down with
+        it. The halves are written in queue order. Returns the rooms written.
+        """
+        if len(batch) == 1:
+            self.dropped += 1
+            metrics.VOTES_DROPPED.inc()
+            logger.error("dropping vote %r", batch[0])
+            return {}
+        rooms = {}
+        middle = len(batch) // 2
+        for half in (batch[:middle], batch[middle:]):
+            try:
+                rooms.update(self.write_batch(half))
+            except Exception:
+                logger.exception("vote batch of %d failed", len(half))
+            else:
+                self._count_flushed(len(half))
+                continue
+            rooms.update(self._write_halves(half))
+        return rooms
+
+    def _count_flushed(self, count):
+        self.flushed += count
+        metrics.VOTES_FLUSHED.inc(count)
+
+    def write_batch(self, batch):
+        """Write a batch in one transaction; returns {question_id: room_id}."""
+        votes = models.QuestionVote.__table__
+        questions = models.Question.__table__
+        db = SessionLocal()
+        try:
+            # Lock the questions first: one deleted or archived since its votes
+            # were queued is skipped, and cannot go away until this commits.
+            live = set(
+                db.execute(
+                    select(questions.c.id)
+                    .where(questions.c.id.in_({v["question_id"] for v in batch}))
+                    .order_by(questions.c.id)
+                    .with_for_update()
+                ).scalars()
+            )
+            rooms = {}
+            # Only a voter's last action in the batch matters (one vote per voter).
+            latest = {}
+            for vote in batch:
+                if vote["question_id"] not in live:
+                    continue
+                rooms[vote["question_id"]] = vote["room_id"]
+                latest[(vote["question_id"], vote["voter_token"])] = vote
+
+            existing = {}
+            if latest:
+                rows = db.execute(
+                    select(
+                        votes.c.id,
+                        votes.c.question_id,
+                        votes.c.voter_token,
+                        votes.c.vote_type,
+                    )
+                    .where(
+                        votes.c.question_id.in_({qid for qid, _ in latest}),
+                        votes.c.voter_token.in_({token for _, token in latest}),
+                    )
+                    .with_for_update()
+                )
+                existing = {(r.question_id, r.voter_token): r for r in rows}
+
+            deltas = defaultdict(lambda: {"up": 0, "down": 0})
+            inserts, changes, deletes = [], [], []
+            for key, vote in latest.items():
+                old = existing.get(key)
+                new_type = vote["vote_type"]
+                if old is not None:
+                    if old.vote_type == new_type:
+                        continue
+                    deltas[vote["question_id"]][old.vote_type] -= 1
+                    if new_type is None:
+                        deletes.append(old.id)
+                    else:
+                        changes.append({"vid": old.id, "new_type": new_type})
+                elif new_type is not None:
+                    inserts.append(vote)
+                if new_type is not None:
+                    deltas[vote["question_id"]][new_type] += 1
+
+            if inserts:
+                # the EXISTS guard keeps a vote for a question removed despite
+                # the lock from failing the batch on the foreign key
+                row = select(
+                    bindparam("question_id", type_=Integer),
+                    bindparam("voter_token", type_=String),
+                    bindparam("vote_type", type_=String),
+                    bindparam("created_at", type_=DateTime),
+                ).where(exists().where(questions.c.id == bindparam("question_id")))
+                db.execute(
+                    insert(votes).from_select(
+                        ["question_id", "voter_token", "vote_type", "created_at"], row
+                    ),
+                    [
+                        {
+                            "question_id": v["question_id"],
+                            "voter_token": v["voter_token"],
+                            "vote_type": v["vote_type"],
+                            "created_at": v["created_at"],
+                        }
+                        for v in inserts
+                    ],
+                )
+            if changes:
+                db.execute(
+                    update(votes)
+                    .where(votes.c.id == bindparam("vid"))
+                    .values(vote_type=bindparam("new_type")),
+                    changes,
+                )
+            if deletes:
+                db.execute(delete(votes).where(votes.c.id.in_(deletes)))
+            if deltas:
+                db.execute(
+                    update(questions)
+                    .where(questions.c.id == bindparam("qid"))
+                    .values(
+                        upvotes=questions.c.upvotes + bindparam("up"),
+                        downvotes=questions.c.downvotes + bindparam("down"),
+                    ),
+                    [{"qid": qid, **d} for qid, d in deltas.items()],
+                )
+                refresh_hot_scores(db, list(deltas))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        for vote in inserts:
+            metrics.VOTES_CAST.labels(vote["vote_type"]).inc()
+        for change in changes:
+            metrics.VOTES_CAST.labels(change["new_type"]).inc()
+        if deletes:
+            metrics.VOTES_CAST.labels("withdrawn").inc(len(deletes))
+        return {qid: rooms[qid] for qid in deltas}
+
+    def announce(self, rooms):
+        db = SessionLocal()
+        try:
+            totals = (
+                db.query(
+                    models.Question.id,
+                    models.Question.upvotes,
+                    models.Question.downvotes,
+                )
+                .filter(models.Question.id.in_(rooms))
+                .all()
+            )
+        finally:
+            db.close()
+        for question_id, up, down in totals:
+            room_id = rooms[question_id]
+            invalidate(room_id=room_id, question_id=question_id)
+            publish(room_id, "vote_changed", question_id=question_id, up=up, down=down)
+
+
+batcher = VoteBatcher()
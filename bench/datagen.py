@@ -0,0 +1,107 @@
+"""Seed a database with N rooms x M questions x K votes for benchmarking."""
+
+import asyncio
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+BENCH_PASSWORD = "bench-password"
+
+
+def generate(rooms=5, questions=300, votes=20, teachers=5, seed=0):
+    """
+    Wipe and seed the database configured by DB_URL.
+
+    Returns the ids/codes the scenarios need: teachers (email, password),
+    room ids and codes, and question ids per room.
+    """
+    from app import models
+    from app.database import Base, SessionLocal, engine
+    from app.passwords import hash_password
+    from app.ranking import hot_score
+
+    rng = random.Random(seed)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    password_hash = asyncio.run(hash_password(BENCH_PASSWORD))
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        teacher_rows = [
+            {
+                "name": f"Bench Teacher {i}",
+                "email": f"bench{i}@example.com",
+                "password_hash": password_hash,
+                "created_at": now,
+            }
+            for i in range(teachers)
+        ]
+        db.execute(insert(models.Teacher), teacher_rows)
+        teacher_ids = [t.id for t in db.query(models.Teacher.id).all()]
+
+        room_rows = [
+            {
+                "title": f"Lecture {i}",
+                "room_code": uuid.uuid4().hex[:6].upper(),
+                "owner_id": teacher_ids[i % len(teacher_ids)],
+                "is_open": True,
+                "created_at": now,
+            }
+            for i in range(rooms)
+        ]
+        db.execute(insert(models.Room), room_rows)
+        room_list = db.query(models.Room.id, models.Room.room_code).all()
+
+        question_rows = []
+        for room_id, _ in room_list:
+            for j in range(questions):
+                up = rng.randint(0, votes)
+                created_at = now - timedelta(seconds=questions - j)
+                question_rows.append(
+                    {
+                        "room_id": room_id,
+                        "title": f"Question {j} in room {room_id}",
+                        "description": "Could you go over this part again? " * 3,
+                        "student_name": f"student{j}",
+                        "created_at": created_at,
+                        "is_solved": False,
+                        "upvotes": up,
+                        "downvotes": votes - up,
+                        "hot_score": hot_score(up, votes - up, created_at),
+                    }
+                )
+        db.execute(insert(models.Question), question_rows)
+
+        question_ids = {room_id: [] for room_id, _ in room_list}
+        for qid, room_id in db.query(
+            models.Question.id, models.Question.room_id
+        ).order_by(models.Question.id):
+            question_ids[room_id].append(qid)
+
+        vote_rows = []
+        for qid, row in zip(
+            (qid for ids in question_ids.values() for qid in ids), question_rows
+        ):
+            for k in range(votes):
+                vote_rows.append(
+                    {
+                        "question_id": qid,
+                        "voter_token": f"seed-voter-{k}",
+                        "vote_type": "up" if k < row["upvotes"] else "down",
+                        "created_at": now,
+                    }
+                )
+        if vote_rows:
+            db.execute(insert(models.QuestionVote), vote_rows)
+        db.commit()
+    finally:
+        db.close()
+
+    return {
+        "teachers": [(t["email"], BENCH_PASSWORD) for t in teacher_rows],
+        "rooms": [{"id": rid, "code": code} for rid, code in room_list],
+        "questions": question_ids,
+    }
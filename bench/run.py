@@ -0,0 +1,267 @@
+"""
+Load-test the Questup API flows that matter during a live lecture.
+
+    python -m bench.run                                   # SQLite, in-process
+    python -m bench.run --mode uvicorn --workers 4        # real server
+    python -m bench.run --db-url postgresql://localhost/questup_bench --reset
+    python -m bench.run --save bench/baselines/sqlite-inprocess.json
+    python -m bench.run --compare bench/baselines/sqlite-inprocess.json
+
+The target database is wiped and seeded with --rooms x --questions x --votes
+before the run. Each scenario reports throughput and p50/p95/p99 latency;
+--compare exits non-zero when a scenario regresses past --threshold.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+SCENARIOS = ["join_room", "list_questions", "vote", "post_question", "login"]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(
+        len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1)))
+    )
+    return sorted_values[index]
+
+
+def build_request(scenario, rng, data):
+    room = rng.choice(data["rooms"])
+    if scenario == "join_room":
+        return "POST", "/rooms/join", {"room_code": room["code"]}
+    if scenario == "list_questions":
+        sort = rng.choice(["recent", "votes"])
+        return "GET", f"/rooms/{room['id']}/questions?sort={sort}", None
+    if scenario == "vote":
+        qid = rng.choice(data["questions"][room["id"]])
+        return (
+            "POST",
+            f"/questions/{qid}/vote",
+            {
+                "vote_type": rng.choice(["up", "up", "down"]),
+                "voter_token": uuid.uuid4().hex,
+            },
+        )
+    if scenario == "post_question":
+        return (
+            "POST",
+            f"/rooms/{room['id']}/questions",
+            {
+                "title": f"Bench question {uuid.uuid4().hex[:8]}",
+                "student_name": "bench",
+            },
+        )
+    if scenario == "login":
+        email, password = rng.choice(data["teachers"])
+        return "POST", "/auth/teachers/login", {"email": email, "password": password}
+    raise ValueError(scenario)
+
+
+async def run_scenario(client, scenario, data, requests, concurrency, seed):
+    rng = random.Random(seed)
+    plan = [build_request(scenario, rng, data) for _ in range(requests)]
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while plan:
+            method, url, body = plan.pop()
+            start = time.perf_counter()
+            try:
+                resp = await client.request(method, url, json=body)
+                ok = resp.status_code < 400 and resp.json().get("success", True)
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_uvicorn(workers):
+    port = free_port()
+    proc = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ],
+        env=os.environ.copy(),
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health").status_code == 200:
+                return proc, base_url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("uvicorn did not start")
+
+
+async def run_all(args, data):
+    proc = None
+    if args.mode == "uvicorn":
+        proc, base_url = start_uvicorn(args.workers)
+        transport = None
+    else:
+        from app.main import app
+
+        base_url = "http://bench"
+        transport = httpx.ASGITransport(app=app)
+
+    results = {}
+    try:
+        async with httpx.AsyncClient(
+            transport=transport, base_url=base_url, timeout=60
+        ) as client:
+            for i, scenario in enumerate(args.scenarios):
+                requests = args.login_requests if scenario == "login" else args.requests
+                # warm caches/connections so the numbers describe steady state
+                await run_scenario(client, scenario, data, min(20, requests), 4, -i)
+                results[scenario] = await run_scenario(
+                    client, scenario, data, requests, args.concurrency, args.seed + i
+                )
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print deltas against a saved baseline; returns the regressed scenarios."""
+    regressions = []
+    print(f"\n{'scenario':<16}{'metric':<8}{'baseline':>10}{'now':>10}{'delta':>9}")
+    for scenario, now in results.items():
+        before = baseline["results"].get(scenario)
+        if not before:
+            continue
+        for metric in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+            old, new = before[metric], now[metric]
+            delta = (new - old) / old * 100 if old else 0.0
+            worse = -delta if metric == "rps" else delta
+            flag = "  <-- regression" if worse > threshold else ""
+            if flag and scenario not in regressions:
+                regressions.append(scenario)
+            print(f"{scenario:<16}{metric:<8}{old:>10}{new:>10}{delta:>+8.1f}%{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.run")
+    parser.add_argument("--db-url", help="database to benchmark (default: temp SQLite)")
+    parser.add_argument(
+        "--reset",
+        action="store_true",
+        help="confirm wiping a non-SQLite --db-url before seeding",
+    )
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--rooms", type=int, default=5)
+    parser.add_argument("--questions", type=int, default=300)
+    parser.add_argument("--votes", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--login-requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--save", help="write results to this baseline file")
+    parser.add_argument("--compare", help="baseline file to diff against")
+    parser.add_argument(
+        "--threshold", type=float, default=10.0, help="regression threshold in %%"
+    )
+    args = parser.parse_args(argv)
+
+    db_url = args.db_url
+    if not db_url:
+        db_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    elif not db_url.startswith("sqlite") and not args.reset:
+        parser.error("this wipes the target database; pass --reset to confirm")
+    # app modules read their configuration at import time
+    os.environ["DB_URL"] = db_url
+    # every simulated client shares one IP; measure the app, not the limiter
+    os.environ.setdefault("RATE_LIMITS", "off")
+
+    from bench.datagen import generate
+
+    data = generate(args.rooms, args.questions, args.votes, seed=args.seed)
+    results = asyncio.run(run_all(args, data))
+
+    print(
+        f"{'scenario':<16}{'reqs':>6}{'errs':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}"
+    )
+    for scenario, r in results.items():
+        print(
+            f"{scenario:<16}{r['requests']:>6}{r['errors']:>6}{r['rps']:>9}"
+            f"{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}"
+        )
+
+    report = {
+        "config": {
+            "backend": db_url.split(":", 1)[0],
+            "mode": args.mode,
+            "workers": args.workers,
+            "rooms": args.rooms,
+            "questions": args.questions,
+            "votes": args.votes,
+            "concurrency": args.concurrency,
+        },
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline["config"] != report["config"]:
+            print("warning: baseline was recorded with a different configuration")
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import uuid
+
+import pytest
+
+# The app reads its settings at import time, so they are set before any test
+# module imports it.
+_tmp = tempfile.mkdtemp(prefix="questup-tests-")
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ["CACHE_STAMP_FILE"] = os.path.join(_tmp, "stamps")
+os.environ["RATE_LIMITS"] = "off"
+# votes are written synchronously; test_vote_batcher drives the batcher itself
+os.environ["VOTE_BATCHING"] = "0"
+os.environ["BCRYPT_ROUNDS"] = "4"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+from app.manage import migrate  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    migrate()
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture
+def new_teacher(client):
+    """Register a fresh teacher; returns a function that logs them in."""
+
+    def register():
+        email = f"{uuid.uuid4().hex}@example.com"
+        r = client.post(
+            "/auth/teachers/register",
+            params={"admin_secret": "adminsecret"},
+            json={"name": "Teacher", "email": email, "password": "secret"},
+        )
+        assert r.json()["success"]
+
+        def log_in():
+            r = client.post(
+                "/auth/teachers/login", json={"email": email, "password": "secret"}
+            )
+            return {"x-token": r.json()["token"]}
+
+        return log_in
+
+    return register
+
+
+@pytest.fixture
+def login(new_teacher):
+    return new_teacher()
+
+
+@pytest.fixture
+def teacher(login):
+    """Auth headers for a fresh, logged-in teacher."""
+    return login()
+
+
+@pytest.fixture
+def room(client, teacher):
+    return client.post("/rooms", json={"title": "Lecture"}, headers=teacher).json()[
+        "id"
+    ]
+
+
+@pytest.fixture
+def ask(client):
+    def ask(room_id, title, description=None):
+        r = client.post(
+            f"/rooms/{room_id}/questions",
+            json={"title": title, "description": description},
+        )
+        return r.json()["question"]["id"]
+
+    return ask
@@ -0,0 +1,61 @@
+from app import models
+from app.database import SessionLocal
+from app.deps import (
+    cached_teacher,
+    invalidate_teacher,
+    remember_teacher,
+    stamps,
+    token_stamp_key,
+)
+
+
+def me(client, headers):
+    return client.get("/auth/teachers/me", headers=headers).json()
+
+
+def test_logout_invalidates_the_cached_token(client, teacher):
+    assert me(client, teacher)["success"]  # now cached
+    assert client.post("/auth/teachers/logout", headers=teacher).json()["success"]
+    assert me(client, teacher) == {
+        "success": False,
+        "detail": "Invalid token or not logged in",
+    }
+
+
+def test_logout_in_another_worker_invalidates_the_cached_token(client, teacher):
+    assert me(client, teacher)["success"]
+    token = teacher["x-token"]
+    # what the other worker's logout does: clear the token, bump its stamp
+    db = SessionLocal()
+    try:
+        db.query(models.Teacher).filter(models.Teacher.token == token).update(
+            {"token": None}
+        )
+        db.commit()
+    finally:
+        db.close()
+    stamps.bump(token_stamp_key(token))
+    assert not me(client, teacher)["success"]
+
+
+def test_logout_during_a_lookup_is_not_cached_over(client, teacher):
+    token = teacher["x-token"]
+    cached, stamp = cached_teacher(token)
+    assert cached is None
+    db = SessionLocal()
+    try:
+        found = db.query(models.Teacher).filter(models.Teacher.token == token).one()
+        db.expunge(found)
+    finally:
+        db.close()
+    invalidate_teacher(token)  # the logout commits while the lookup runs
+    remember_teacher(token, found, stamp)
+    assert cached_teacher(token)[0] is None
+
+
+def test_login_again_after_logout(client, login):
+    first = login()
+    client.post("/auth/teachers/logout", headers=first)
+    second = login()
+    assert me(client, second)["success"]
+    assert not me(client, first)["success"]
@@ -0,0 +1,56 @@
+import base64
+import json
+
+import pytest
+
+from app import models
+from app.pagination import decode_cursor, encode_cursor
+
+ORDER = [models.Question.created_at, models.Question.id]
+
+
+def cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    values = [models.Question.created_at.type.python_type(2024, 5, 1, 12, 30), 7]
+    assert decode_cursor(encode_cursor(values), ORDER) == values
+
+
+@pytest.mark.parametrize(
+    "bad",
+    [
+        "WzEsMl0",  # [1, 2]: a number in the datetime slot
+        cursor([None, 2]),
+        cursor(["not a date", 2]),
+        cursor(["2024-05-01T12:30:00", "2"]),
+        cursor(["2024-05-01T12:30:00"]),
+        cursor({"created_at": "2024-05-01T12:30:00", "id": 2}),
+        "%%%",
+        "",
+    ],
+)
+def test_bad_cursors_raise_value_error(bad):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(bad, ORDER)
+
+
+def test_bad_cursor_is_reported_not_raised(client, room, ask):
+    ask(room, "Anything")
+    r = client.get(f"/rooms/{room}/questions", params={"cursor": "WzEsMl0"})
+    assert r.status_code == 200
+    assert r.json() == {"success": False, "detail": "Invalid cursor"}
+
+
+def test_pages_cover_every_question_once(client, room, ask):
+    ids = {ask(room, f"Question {i}") for i in range(7)}
+    seen, next_cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": next_cursor} if next_cursor else {})}
+        page = client.get(f"/rooms/{room}/questions", params=params).json()
+        seen += [q["id"] for q in page["questions"]]
+        next_cursor = page["next_cursor"]
+        if not next_cursor:
+            break
+    assert sorted(seen) == sorted(ids)
@@ -0,0 +1,45 @@
+def titles(client, room_id):
+    page = client.get(f"/rooms/{room_id}/questions").json()
+    return [q["title"] for q in page["questions"]]
+
+
+def test_room_list_sees_new_and_deleted_questions(client, teacher, room, ask):
+    first = ask(room, "First")
+    assert titles(client, room) == ["First"]  # now cached
+    ask(room, "Second")
+    assert titles(client, room) == ["Second", "First"]
+    client.delete(f"/questions/{first}", headers=teacher)
+    assert titles(client, room) == ["Second"]
+
+
+def test_question_detail_sees_edits_and_answers(client, teacher, room, ask):
+    q = ask(room, "Before")
+    detail = client.get(f"/questions/{q}").json()
+    assert (detail["question"]["title"], detail["answers"]) == ("Before", [])
+
+    client.patch(f"/questions/{q}", json={"title": "After"}, headers=teacher)
+    client.post(f"/questions/{q}/answers", json={"content": "Yes"}, headers=teacher)
+
+    detail = client.get(f"/questions/{q}").json()
+    assert detail["question"]["title"] == "After"
+    assert [a["content"] for a in detail["answers"]] == ["Yes"]
+    assert titles(client, room) == ["After"]
+
+
+def test_room_list_sees_votes(client, room, ask):
+    q = ask(room, "Popular")
+    client.get(f"/rooms/{room}/questions")
+    client.post(f"/questions/{q}/vote", json={"vote_type": "up", "voter_token": "a"})
+    page = client.get(f"/rooms/{room}/questions").json()
+    assert [x["votes"] for x in page["questions"]] == [1]
+
+
+def test_etag_revalidation(client, room, ask):
+    ask(room, "Tagged")
+    r = client.get(f"/rooms/{room}/questions")
+    etag = r.headers["etag"]
+    r = client.get(f"/rooms/{room}/questions", headers={"if-none-match": etag})
+    assert r.status_code == 304
+    ask(room, "Changed")
+    r = client.get(f"/rooms/{room}/questions", headers={"if-none-match": etag})
+    assert r.status_code == 200
@@ -0,0 +1,70 @@
+from app.database import SessionLocal
+from app.manage import archive_rooms
+
+
+def search(client, headers, **params):
+    return client.get("/search", params=params, headers=headers).json()
+
+
+def test_search_matches_questions_and_answers(client, teacher, room, ask):
+    recursion = ask(room, "How does recursion work?")
+    closure = ask(room, "What is a closure?")
+    ask(room, "Unrelated")
+    client.post(
+        f"/questions/{closure}/answers",
+        json={"content": "No recursion needed here"},
+        headers=teacher,
+    )
+    hits = search(client, teacher, q="recursion", room_id=room)["questions"]
+    assert sorted(q["id"] for q in hits) == sorted([recursion, closure])
+
+
+def test_search_is_limited_to_the_teachers_rooms(client, new_teacher, room, ask):
+    ask(room, "Private recursion")
+    assert search(client, {}, q="recursion", room_id=room) == {
+        "success": False,
+        "detail": "Unauthorized",
+    }
+    other = new_teacher()()
+    assert search(client, other, q="recursion", room_id=room) == {
+        "success": False,
+        "detail": "Room not found",
+    }
+    assert search(client, other, q="recursion")["questions"] == []
+
+
+def test_search_pages_through_live_then_archived_rooms(client, teacher, ask):
+    old, live = [
+        client.post("/rooms", json={"title": t}, headers=teacher).json()["id"]
+        for t in ("Old", "Live")
+    ]
+    archived = [ask(old, f"Sorting question {i}") for i in range(3)]
+    closure = ask(old, "Closures")
+    client.post(
+        f"/questions/{closure}/answers",
+        json={"content": "Sorting is not involved"},
+        headers=teacher,
+    )
+    current = [ask(live, f"Sorting again {i}") for i in range(2)]
+    client.post(f"/rooms/{old}/close", headers=teacher)
+    db = SessionLocal()
+    try:
+        (line,) = archive_rooms(db, [old])
+    finally:
+        db.close()
+    assert "archived 4 questions" in line
+
+    seen, next_cursor = [], None
+    while True:
+        params = {"q": "sorting", "limit": 2}
+        if next_cursor:
+            params["cursor"] = next_cursor
+        page = search(client, teacher, **params)
+        seen += [q["id"] for q in page["questions"]]
+        next_cursor = page["next_cursor"]
+        if not next_cursor:
+            break
+
+    assert sorted(seen[:2]) == sorted(current)
+    assert sorted(seen[2:]) == sorted(archived + [closure])
+    assert len(seen) == len(set(seen))
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+from app import models
+from app.database import SessionLocal
+from app.vote_batcher import VoteBatcher
+
+
+def vote(room_id, question_id, voter_token, vote_type="up"):
+    return {
+        "room_id": room_id,
+        "question_id": question_id,
+        "vote_type": vote_type,
+        "voter_token": voter_token,
+        "created_at": datetime.utcnow(),
+    }
+
+
+def counters(question_id):
+    db = SessionLocal()
+    try:
+        q = db.get(models.Question, question_id)
+        return q.upvotes, q.downvotes
+    finally:
+        db.close()
+
+
+def test_flush_skips_votes_for_a_deleted_question(client, teacher, room, ask):
+    kept, deleted = ask(room, "Kept"), ask(room, "Deleted")
+    assert client.delete(f"/questions/{deleted}", headers=teacher).json()["success"]
+
+    batcher = VoteBatcher()
+    batcher._flush(
+        [
+            vote(room, kept, "a"),
+            vote(room, deleted, "a"),
+            vote(room, kept, "b", "down"),
+        ]
+    )
+
+    assert (batcher.flushed, batcher.dropped) == (3, 0)
+    assert counters(kept) == (1, 1)
+    db = SessionLocal()
+    try:
+        orphans = db.query(models.QuestionVote).filter_by(question_id=deleted).count()
+    finally:
+        db.close()
+    assert orphans == 0
+
+
+def test_failing_batch_drops_only_the_bad_vote(monkeypatch, room, ask):
+    q = ask(room, "Split")
+    batcher = VoteBatcher()
+    write_batch = batcher.write_batch
+
+    def flaky(batch):
+        if any(v["vote_type"] == "bad" for v in batch):
+            raise RuntimeError("cannot write this vote")
+        return write_batch(batch)
+
+    monkeypatch.setattr(batcher, "write_batch", flaky)
+    monkeypatch.setattr("app.vote_batcher.time.sleep", lambda seconds: None)
+    batcher._flush(
+        [
+            vote(room, q, "a"),
+            vote(room, q, "b", "bad"),
+            vote(room, q, "c"),
+            vote(room, q, "d", "down"),
+        ]
+    )
+
+    assert (batcher.flushed, batcher.dropped) == (3, 1)
+    assert counters(q) == (2, 1)
@@ -0,0 +1,45 @@
+def votes(client, question_id):
+    r = client.get(f"/questions/{question_id}/votes").json()
+    return r["up"], r["down"]
+
+
+def test_vote_unvote_revote_keeps_counters_in_step(client, room, ask):
+    q = ask(room, "Why is the sky blue?")
+
+    for _ in range(3):
+        assert client.post(
+            f"/questions/{q}/vote", json={"vote_type": "up", "voter_token": "a"}
+        ).json()["success"]
+    client.post(f"/questions/{q}/vote", json={"vote_type": "up", "voter_token": "b"})
+    assert votes(client, q) == (2, 0)
+
+    client.post(f"/questions/{q}/vote", json={"vote_type": "down", "voter_token": "a"})
+    assert votes(client, q) == (1, 1)
+
+    r = client.delete(f"/questions/{q}/vote", params={"voter_token": "a"}).json()
+    assert r == {"success": True, "removed": True}
+    assert votes(client, q) == (1, 0)
+    r = client.delete(f"/questions/{q}/vote", params={"voter_token": "a"}).json()
+    assert r == {"success": True, "removed": False}
+    assert votes(client, q) == (1, 0)
+
+    client.post(f"/questions/{q}/vote", json={"vote_type": "up", "voter_token": "a"})
+    assert votes(client, q) == (2, 0)
+    listed = client.get(f"/rooms/{room}/questions").json()["questions"]
+    assert [x["votes"] for x in listed if x["id"] == q] == [2]
+
+
+def test_votes_without_a_voter_token_are_refused(client, room, ask):
+    q = ask(room, "Tokenless")
+    r = client.post(f"/questions/{q}/vote", json={"vote_type": "up"}).json()
+    assert r == {"success": False, "detail": "voter_token required"}
+    r = client.delete(f"/questions/{q}/vote").json()
+    assert r == {"success": False, "detail": "voter_token required"}
+    assert votes(client, q) == (0, 0)
+
+
+def test_vote_on_missing_question(client):
+    r = client.post(
+        "/questions/999999/vote", json={"vote_type": "up", "voter_token": "a"}
+    ).json()
+    assert r == {"success": False, "detail": "Question not found"}